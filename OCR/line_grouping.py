@@ -0,0 +1,93 @@
+import numpy as np
+import cv2
+import torch
+import torch.nn.functional as F
+
+# Group CRAFT word boxes into text lines and rectify them in one warp,
+# so the recognizer sees one crop per line in reading order.
+
+def _geometry(box):
+    # CRAFT boxes are clockwise from top-left
+    height = (np.linalg.norm(box[3] - box[0]) + np.linalg.norm(box[2] - box[1])) / 2
+    cx, cy = box.mean(axis=0)
+    return cx, cy, max(height, 1.0)
+
+def group_lines(boxes, y_tol=0.5, gap_tol=2.5):
+    """Group word boxes into lines, returned top-to-bottom, each left-to-right.
+
+    Words first go into row bands: a word joins the band whose centre is
+    within y_tol line heights of its own, so a few pixels of jitter never
+    start a new row. Each band is then cut wherever the horizontal gap
+    between neighbours exceeds gap_tol heights, so the photo column and the
+    text column stay apart, and its pieces are emitted left to right."""
+    words = sorted((_geometry(np.asarray(b, dtype=np.float32)) + (np.asarray(b, dtype=np.float32),) for b in boxes),
+                   key=lambda w: w[1])
+    bands = []  # [cy, height, [words]]
+    for word in words:
+        _, cy, h, _ = word
+        best = None
+        for band in bands:
+            dy = abs(band[0] - cy)
+            if dy <= y_tol * max(band[1], h) and (best is None or dy < best[0]):
+                best = (dy, band)
+        if best is None:
+            bands.append([cy, h, [word]])
+            continue
+        band = best[1]
+        n = len(band[2])
+        band[0] = (band[0] * n + cy) / (n + 1)
+        band[1] = (band[1] * n + h) / (n + 1)
+        band[2].append(word)
+
+    lines = []
+    for _, height, band_words in sorted(bands, key=lambda b: b[0]):
+        band_words.sort(key=lambda w: w[3][:, 0].min())
+        line, right = [], None
+        for _, _, _, box in band_words:
+            x0, x1 = box[:, 0].min(), box[:, 0].max()
+            if line and x0 - right > gap_tol * height:
+                lines.append(line)
+                line = []
+            right = x1 if not line else max(right, x1)
+            line.append(box)
+        lines.append(line)
+    return lines
+
+def line_quad(line_boxes):
+    """Tight rotated rectangle around a line, clockwise from top-left."""
+    pts = np.concatenate(line_boxes).astype(np.float32)
+    quad = cv2.boxPoints(cv2.minAreaRect(pts))
+    centre = quad.mean(axis=0)
+    # Sorting by angle is clockwise in image coordinates (y points down)
+    quad = quad[np.argsort(np.arctan2(quad[:, 1] - centre[1], quad[:, 0] - centre[0]))]
+    return np.roll(quad, -int(quad.sum(axis=1).argmin()), axis=0)
+
+def warp_lines(image, quads, height=48):
+    """Perspective-rectify every quad to `height` px tall with a single
+    grid_sample call: the per-line sampling grids are stacked vertically and
+    sampled from the image once, then split back into crops."""
+    if not len(quads):
+        return []
+    img_h, img_w = image.shape[:2]
+    widths = []
+    for q in quads:
+        w = (np.linalg.norm(q[1] - q[0]) + np.linalg.norm(q[2] - q[3])) / 2
+        h = (np.linalg.norm(q[3] - q[0]) + np.linalg.norm(q[2] - q[1])) / 2
+        widths.append(max(1, int(round(height * w / max(h, 1.0)))))
+    max_w = max(widths)
+
+    grid = np.full((len(quads) * height, max_w, 2), -2.0, dtype=np.float32)  # outside -> zeros
+    us, vs = np.meshgrid(np.arange(max_w, dtype=np.float32), np.arange(height, dtype=np.float32))
+    for i, (q, w) in enumerate(zip(quads, widths)):
+        dst = np.float32([[0, 0], [w - 1, 0], [w - 1, height - 1], [0, height - 1]])
+        M = cv2.getPerspectiveTransform(dst, np.asarray(q, dtype=np.float32))
+        pts = M @ np.stack([us[:, :w].ravel(), vs[:, :w].ravel(), np.ones(height * w, dtype=np.float32)])
+        x, y = pts[0] / pts[2], pts[1] / pts[2]
+        # Pixel centres sit at (2i + 1) / size - 1 with align_corners=False
+        grid[i * height:(i + 1) * height, :w, 0] = ((2 * x + 1) / img_w - 1).reshape(height, w)
+        grid[i * height:(i + 1) * height, :w, 1] = ((2 * y + 1) / img_h - 1).reshape(height, w)
+
+    src = torch.from_numpy(np.ascontiguousarray(image)).permute(2, 0, 1).unsqueeze(0).float()
+    out = F.grid_sample(src, torch.from_numpy(grid).unsqueeze(0), mode="bilinear", padding_mode="zeros", align_corners=False)
+    out = out[0].permute(1, 2, 0).round().clamp(0, 255).to(torch.uint8).numpy()
+    return [out[i * height:(i + 1) * height, :w] for i, w in enumerate(widths)]
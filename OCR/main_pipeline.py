@@ -1,22 +1,23 @@
-from preprocess import preprocess_image
-from detect_text import load_craft_model, detect_text_regions
-from recognize_text import recognize_text
+from preprocessing import preprocess_image
+from text_detection import load_craft_model, detect_text_regions, deskew
+from text_recognition import recognize_lines
+from line_grouping import group_lines, line_quad, warp_lines
 from extract_fields import extract_fields
 import cv2
 
 # Process single image (front or back)
 def process_image(image_path, craft_model):
     thresh, orig_image = preprocess_image(image_path)
+    # Straighten rotated/skewed cards before the full-resolution detection
+    orig_image, _ = deskew(craft_model, orig_image)
     boxes = detect_text_regions(craft_model, orig_image)
-    
-    full_text = ""
-    for box in boxes:
-        x_min, y_min = box[:, 0].min(), box[:, 1].min()
-        x_max, y_max = box[:, 0].max(), box[:, 1].max()
-        cropped = orig_image[int(y_min):int(y_max), int(x_min):int(x_max)]
-        text = recognize_text(cropped)
-        full_text += text + "\n"
-    return full_text
+
+    # One rectified crop per text line, in reading order for extract_fields
+    lines = group_lines(boxes)
+    rgb = cv2.cvtColor(orig_image, cv2.COLOR_BGR2RGB)
+    crops = warp_lines(rgb, [line_quad(line) for line in lines])
+    texts = recognize_lines(crops)
+    return "".join(text + "\n" for text in texts)
 
 def run_aadhar_pipeline(front_image_path, back_image_path):
     craft_model = load_craft_model()
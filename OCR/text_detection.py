@@ -1,9 +1,11 @@
+import math
 import torch
 import cv2
 import numpy as np
 from craft import CRAFT
 from collections import OrderedDict
-from craft_utils import getDetBoxes
+from craft_utils import getDetBoxes, adjustResultCoordinates
+from imgproc import resize_aspect_ratio, normalizeMeanVariance
 from skimage import img_as_float32
 
 def load_craft_model():
@@ -28,3 +30,119 @@ def detect_text(model, image):
     boxes, _ = getDetBoxes(y[0,:,:,0].numpy(), y[0,:,:,1].numpy(), 
                             text_threshold=0.7, link_threshold=0.4, low_text=0.4)
     return boxes
+
+
+def run_craft(model, image, canvas_size, mag_ratio=1.0, text_threshold=0.7, link_threshold=0.4, low_text=0.4):
+    """Run CRAFT on an RGB image; boxes are returned in image coordinates."""
+    img_resized, target_ratio, _ = resize_aspect_ratio(image, canvas_size, cv2.INTER_LINEAR, mag_ratio=mag_ratio)
+    ratio = 1 / target_ratio
+    x = torch.from_numpy(normalizeMeanVariance(img_resized)).permute(2, 0, 1).unsqueeze(0)
+    with torch.no_grad():
+        y, _ = model(x)
+    score_text = y[0, :, :, 0].numpy()
+    score_link = y[0, :, :, 1].numpy()
+    boxes, _ = getDetBoxes(score_text, score_link, text_threshold, link_threshold, low_text)
+    boxes = adjustResultCoordinates(boxes, ratio, ratio)
+    return list(boxes), score_text
+
+def merge_rects(rects):
+    """Union overlapping (x0, y0, x1, y1) rectangles until none overlap."""
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for r in rects:
+            for m in out:
+                if r[0] <= m[2] and m[0] <= r[2] and r[1] <= m[3] and m[1] <= r[3]:
+                    m[0], m[1] = min(m[0], r[0]), min(m[1], r[1])
+                    m[2], m[3] = max(m[2], r[2]), max(m[3], r[3])
+                    merged = True
+                    break
+            else:
+                out.append(r)
+        rects = out
+    return rects
+
+def text_regions(boxes, img_w, img_h, pad_ratio=0.5):
+    """Padded, merged axis-aligned regions around coarse detections."""
+    rects = []
+    for box in boxes:
+        x0, y0 = box[:, 0].min(), box[:, 1].min()
+        x1, y1 = box[:, 0].max(), box[:, 1].max()
+        # Pad by a fraction of the text height so clipped glyphs and
+        # neighbouring small text (VID, address lines) fall inside the crop
+        pad = max(8, (y1 - y0) * pad_ratio)
+        rects.append((max(0, int(x0 - pad)), max(0, int(y0 - pad)),
+                      min(img_w, int(x1 + pad) + 1), min(img_h, int(y1 + pad) + 1)))
+    return merge_rects(rects)
+
+def detect_text_coarse_to_fine(model, image, coarse_size=640, fine_size=2560, fine_mag=1.5, pad_ratio=0.5, full_pass_coverage=0.6):
+    """Two-pass CRAFT: find text-bearing regions on a small canvas, then
+    re-detect only inside those regions at full detection resolution.
+
+    The fine pass uses the scale a single full-canvas run would use
+    (fine_mag, capped so the image fits in fine_size), so recall matches the
+    expensive run while the network only sees the cropped area."""
+    img_h, img_w = image.shape[:2]
+    coarse_boxes, _ = run_craft(model, image, coarse_size, mag_ratio=1.0, low_text=0.3)
+    if not coarse_boxes:
+        return []
+
+    scale = min(fine_mag, fine_size / max(img_h, img_w))
+    regions = text_regions(coarse_boxes, img_w, img_h, pad_ratio)
+    covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    if covered > full_pass_coverage * img_w * img_h:
+        # Text everywhere: cropping saves nothing, do one full pass
+        boxes, _ = run_craft(model, image, fine_size, mag_ratio=scale)
+        return boxes
+
+    boxes = []
+    for x0, y0, x1, y1 in regions:
+        crop = image[y0:y1, x0:x1]
+        region_size = int(max(x1 - x0, y1 - y0) * scale) + 32
+        crop_boxes, _ = run_craft(model, crop, region_size, mag_ratio=scale)
+        boxes.extend(box + np.array([x0, y0], dtype=np.float32) for box in crop_boxes)
+    return boxes
+
+def detect_text_regions(model, image, mode="two_pass", **kwargs):
+    """Detect word boxes on a BGR image (as loaded by cv2)."""
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if mode == "two_pass":
+        return detect_text_coarse_to_fine(model, rgb, **kwargs)
+    boxes, _ = run_craft(model, rgb, kwargs.get("fine_size", 2560), mag_ratio=kwargs.get("fine_mag", 1.5))
+    return boxes
+
+def estimate_skew(model, image, canvas_size=640):
+    """Counter-clockwise angle (degrees, modulo 180) that makes the words found
+    on a small CRAFT canvas horizontal; image is BGR."""
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    boxes, _ = run_craft(model, rgb, canvas_size, low_text=0.3)
+    # Average the long-edge directions on the doubled-angle circle so that
+    # +89 and -89 degrees (vertical text) agree instead of cancelling out
+    c = s = 0.0
+    for box in boxes:
+        e1, e2 = box[1] - box[0], box[2] - box[1]
+        edge = e1 if np.linalg.norm(e1) >= np.linalg.norm(e2) else e2
+        theta = math.atan2(edge[1], edge[0])
+        weight = np.linalg.norm(edge)
+        c += weight * math.cos(2 * theta)
+        s += weight * math.sin(2 * theta)
+    if c == 0 and s == 0:
+        return 0.0
+    return math.degrees(math.atan2(s, c) / 2)
+
+def deskew(model, image, min_angle=0.5):
+    """Rotate a BGR image so text lines are horizontal. Quarter turns are
+    recovered from the word direction; 180 degree turns are not."""
+    angle = estimate_skew(model, image)
+    if abs(angle) < min_angle:
+        return image, 0.0
+    h, w = image.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    cos, sin = abs(M[0, 0]), abs(M[0, 1])
+    new_w, new_h = int(h * sin + w * cos), int(h * cos + w * sin)
+    M[0, 2] += new_w / 2 - w / 2
+    M[1, 2] += new_h / 2 - h / 2
+    rotated = cv2.warpAffine(image, M, (new_w, new_h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return rotated, angle
@@ -3,9 +3,21 @@ from PIL import Image
 
 processor = TrOCRProcessor.from_pretrained("microsoft/trocr-base-handwritten")
 model = VisionEncoderDecoderModel.from_pretrained("microsoft/trocr-base-handwritten")
+# The checkpoint's default max_length of 20 tokens cuts address lines short;
+# the longest card line (~80 characters) stays well under this
+MAX_LINE_TOKENS = 64
 
 def recognize_text(cropped_img):
     pixel_values = processor(images=cropped_img, return_tensors="pt").pixel_values
-    generated_ids = model.generate(pixel_values)
+    generated_ids = model.generate(pixel_values, max_new_tokens=MAX_LINE_TOKENS)
     generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
     return generated_text
+
+def recognize_lines(crops, batch_size=16):
+    """Recognize a list of line crops, batching them through the model."""
+    texts = []
+    for i in range(0, len(crops), batch_size):
+        pixel_values = processor(images=list(crops[i:i + batch_size]), return_tensors="pt").pixel_values
+        generated_ids = model.generate(pixel_values, max_new_tokens=MAX_LINE_TOKENS)
+        texts.extend(processor.batch_decode(generated_ids, skip_special_tokens=True))
+    return texts
@@ -0,0 +1,131 @@
+# admission.py
+# Concurrency limit and bounded wait queue in front of the CPU-bound OCR stage.
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from metrics import QUEUE_DEPTH, SHED
+
+
+class AdmissionController:
+    """At most `limit` requests hold an OCR slot; up to `max_queue` more wait
+    for one, each for at most `queue_timeout` seconds. Anything beyond that is
+    shed immediately with 429 so the work already admitted can finish.
+
+    With `fair` set, waiters are queued per user and slots are handed out
+    round-robin across users, so one batch client cannot starve the rest."""
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float, fair: bool = False, max_queue_per_user: int = 0):
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.fair = fair
+        self.max_queue_per_user = max_queue_per_user
+        self._active = 0
+        self._queued = 0
+        self._waiters = OrderedDict()  # user key -> deque of futures
+        self._service_time = 1.0  # EWMA of slot hold time, for Retry-After
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            limit=int(os.getenv("OCR_CONCURRENCY", "2")),
+            max_queue=int(os.getenv("OCR_QUEUE_SIZE", "16")),
+            queue_timeout=float(os.getenv("OCR_QUEUE_TIMEOUT", "30")),
+            fair=os.getenv("OCR_FAIR_QUEUE", "0") == "1",
+            max_queue_per_user=int(os.getenv("OCR_QUEUE_PER_USER", "0")),
+        )
+
+    @asynccontextmanager
+    async def slot(self, user_id: str = None, timeout: float = None):
+        await self.acquire(user_id, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._finish(start)
+
+    async def run(self, work, user_id: str = None, timeout: float = None):
+        """Await `work()` in a slot held until the work itself is done. For
+        threadpool work that cannot be interrupted: if the caller is
+        cancelled (deadline, disconnect), the slot stays taken until the
+        thread returns instead of admitting another request on top of it."""
+        await self.acquire(user_id, timeout)
+        start = time.monotonic()
+        task = asyncio.ensure_future(work())
+
+        def done(t):
+            if not t.cancelled():
+                t.exception()  # retrieved here when the caller is gone
+            self._finish(start)
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    def _finish(self, start: float):
+        self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - start)
+        self.release()
+
+    def retry_after(self) -> int:
+        # Time for the current queue to drain at the observed service rate
+        return max(1, math.ceil(self._service_time * (self._queued + 1) / self.limit))
+
+    def _shed(self, status: int, reason: str, detail: str):
+        SHED.labels(reason).inc()
+        raise HTTPException(status_code=status, detail=detail, headers={"Retry-After": str(self.retry_after())})
+
+    async def acquire(self, user_id: str = None, timeout: float = None):
+        if self._active < self.limit and not self._queued:
+            self._active += 1
+            return
+        if self._queued >= self.max_queue:
+            self._shed(429, "queue_full", "OCR queue is full")
+        key = user_id if self.fair else None
+        waiters = self._waiters.get(key)
+        if self.max_queue_per_user and waiters and len(waiters) >= self.max_queue_per_user:
+            self._shed(429, "user_queue_full", "Too many queued requests for this user")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(fut)
+        self._queued += 1
+        QUEUE_DEPTH.set(self._queued)
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        try:
+            done, _ = await asyncio.wait({fut}, timeout=timeout)
+        except BaseException:
+            # Caller cancelled (e.g. client went away) while waiting
+            self._abandon(fut)
+            raise
+        if not done:
+            self._abandon(fut)
+            self._shed(503, "queue_timeout", "Timed out waiting for an OCR slot")
+
+    def _abandon(self, fut):
+        if fut.done() and not fut.cancelled():
+            # The slot was handed over just as we gave up; pass it on
+            self.release()
+            return
+        fut.cancel()  # release() skips cancelled waiters
+        self._queued -= 1
+        QUEUE_DEPTH.set(self._queued)
+
+    def release(self):
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            fut = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(key)  # round-robin across users
+            else:
+                del self._waiters[key]
+            if fut.cancelled():
+                continue
+            # Hand the slot straight to the waiter; _active is unchanged
+            self._queued -= 1
+            QUEUE_DEPTH.set(self._queued)
+            fut.set_result(None)
+            return
+        self._active -= 1
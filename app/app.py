@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, HttpUrl
 from PIL import Image
 import requests
@@ -8,10 +9,17 @@ import os
 import openai
 import csv
 from datetime import datetime
-import json
-import re
+import threading
 from dotenv import load_dotenv
 
+from metrics import stage, metrics_response, mark_worker_dead, DUPLICATES, IN_FLIGHT
+from admission import AdmissionController
+from orientation import normalize_orientation
+from extraction import llm_extract, LLMResponseError
+from ocr_corpus import OcrCorpus
+from pdf_input import fetch_pdf, read_pdf_card, PdfInputError
+from typing import Optional
+
 load_dotenv()
 
 client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -20,16 +28,23 @@ app = FastAPI()
 
 CSV_FILE = "aadhaar_responses.csv"
 
+# OCR_CONCURRENCY Tesseract runs at once, OCR_QUEUE_SIZE waiters, 429 beyond that
+admission = AdmissionController.from_env()
+# OCR_RECORD_DIR keeps every OCR result for replay.py regression runs
+ocr_corpus = OcrCorpus.from_env()
+# Duplicate check + append must not interleave across worker threads
+csv_lock = threading.Lock()
+
 class AadhaarURLRequest(BaseModel):
     user_id: str
-    front_url: HttpUrl
-    back_url: HttpUrl
-
-def clean_response(text: str) -> str:
-    # Remove Markdown-style code block wrappers
-    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE)
-    return cleaned.strip()
+    front_url: Optional[HttpUrl] = None
+    back_url: Optional[HttpUrl] = None
+    # e-Aadhaar PDF instead of the two photos
+    pdf_url: Optional[HttpUrl] = None
+    pdf_password: Optional[str] = None
 
+# PDF card regions are rendered at this longest side, ~300 DPI for a card
+PDF_MAX_SIDE = 1000
 
 def save_to_csv(user_id: str, aadhaar_info: dict):
     file_exists = os.path.isfile(CSV_FILE)
@@ -62,133 +77,94 @@ def check_duplicate(aadhaar_number: str, vid: str) -> bool:
                 return True
     return False
 
-def find_all_aadhaar_vid(text):
-    """
-    Extract Aadhaar number and VID from text using regex.
-    Returns tuple (aadhaar_number, vid)
-    """
-    # Aadhaar: 12 digits, usually grouped in 4-4-4 or continuous digits
-    aadhaar_pattern = re.compile(r'\b\d{4}\s?\d{4}\s?\d{4}\b')
-    # VID: 16 digits, possibly grouped in 4s with spaces
-    vid_pattern = re.compile(r'\b\d{4}\s?\d{4}\s?\d{4}\s?\d{4}\b')
-
-    aadhaar_match = aadhaar_pattern.search(text.replace('\n', ' '))
-    vid_match = vid_pattern.search(text.replace('\n', ' '))
-
-    aadhaar_number = aadhaar_match.group().replace(' ', '') if aadhaar_match else ""
-    vid = vid_match.group().replace(' ', '') if vid_match else ""
+@app.on_event("shutdown")
+def shutdown_metrics():
+    mark_worker_dead()
 
-    return aadhaar_number, vid
-
-def valid_12_digit(s):
-    return bool(re.fullmatch(r'\d{12}', s))
-
-def valid_16_digit(s):
-    return bool(re.fullmatch(r'\d{16}', s))
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
 
 @app.post("/upload_url/")
 async def upload_aadhaar_url(payload: AadhaarURLRequest):
-    try:
-        ocr_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz,.-/ '
-
+    with IN_FLIGHT.labels("upload_url").track_inprogress():
+        if not payload.pdf_url and not (payload.front_url and payload.back_url):
+            raise HTTPException(status_code=422, detail="Send front_url and back_url, or pdf_url")
+        try:
+            if payload.pdf_url:
+                texts, images = await run_in_threadpool(download_pdf_card, payload)
+            else:
+                texts, images = None, await run_in_threadpool(download_card, payload)
+            if texts:
+                front_text, back_text = texts  # e-Aadhaar text layer, no OCR needed
+            else:
+                # Only Tesseract is gated; the LLM call is I/O and runs outside the slot
+                async with admission.slot(payload.user_id):
+                    front_text, back_text = await run_in_threadpool(ocr_card, *images)
+            return await run_in_threadpool(extract_and_save, payload, front_text, back_text)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+def download_card(payload: AadhaarURLRequest):
+    with stage("download"):
         front_resp = requests.get(payload.front_url)
         back_resp = requests.get(payload.back_url)
 
         front_img = Image.open(BytesIO(front_resp.content))
         back_img = Image.open(BytesIO(back_resp.content))
+    return front_img, back_img
 
+def download_pdf_card(payload: AadhaarURLRequest):
+    try:
+        with stage("download"):
+            data = fetch_pdf(str(payload.pdf_url))
+        with stage("pdf", "pdfium"):
+            return read_pdf_card(data, PDF_MAX_SIDE, payload.pdf_password)
+    except PdfInputError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+
+def ocr_card(front_img, back_img):
+    ocr_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz,.-/ '
+    with stage("orient"):
+        front_img, _ = normalize_orientation(front_img)
+        back_img, _ = normalize_orientation(back_img)
+    with stage("ocr", "tesseract"):
         front_text = pytesseract.image_to_string(front_img, config=ocr_config)
         back_text = pytesseract.image_to_string(back_img, config=ocr_config)
-        combined_text = front_text + "\n" + back_text
-
-        if len(combined_text.strip()) < 20:
-            return {"status": "error", "message": "OCR output is too short to extract information."}
-
-        messages = [
-            {
-                "role": "system",
-                "content": """
-You are an assistant extracting Aadhaar card information from OCR text. 
-Extract the following Aadhaar fields from this text:
-- Name
-- Date of Birth (DOB)
-- Gender
-- Aadhaar Number (exact 12 digits)
-- VID Number (exact 16 digits)
-- Address
-- Pincode
-- Aadhaar Number must be exactly 12 digits, no letters or spaces.
-- VID must be exactly 16 digits.
-- Return JSON only.
-- If you cannot find the exact value, return empty string "" for that field.
-"""
-            },
-            {
-                "role": "system",
-                "content": f"""
-Extract the following Aadhaar fields from this text:
-- Name
-- Date of Birth (DOB)
-- Gender
-- Aadhaar Number (exact 12 digits)
-- VID Number (exact 16 digits)
-- Address
-- Pincode
-
-Text:
-\"\"\"
-{combined_text}
-\"\"\"
-
-Return result as a JSON object only:
-{{"Name": "...", "DOB": "...", "Gender": "...", "Aadhaar Number": "...", "VID": "...", "Address": "...", "Pincode": "..."}}
-                """
-            }
-        ]
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0,
-            max_tokens=500,
-        )
+    if ocr_corpus is not None:
+        ocr_corpus.record("tesseract", front_img, back_img, front_text, back_text)
+    return front_text, back_text
 
-        answer_text = response.choices[0].message.content
-        cleaned_text = clean_response(answer_text)
-        print("🧹 Cleaned GPT JSON:", cleaned_text)
+def extract_and_save(payload: AadhaarURLRequest, front_text: str, back_text: str):
+    combined_text = front_text + "\n" + back_text
 
+    if len(combined_text.strip()) < 20:
+        return {"status": "error", "message": "OCR output is too short to extract information."}
 
+    with stage("extract", "openai"):
         try:
-            aadhaar_info = json.loads(cleaned_text)
-        except json.JSONDecodeError:
+            aadhaar_info = llm_extract(client, combined_text)
+        except LLMResponseError as e:
             return {
                 "status": "error",
-                "message": "Failed to parse JSON from GPT response.",
-                "raw_response": answer_text
-            }
-
-        # Extract Aadhaar and VID from OCR text as fallback
-        aadhaar_from_text, vid_from_text = find_all_aadhaar_vid(combined_text)
-
-        # Validate and replace GPT output if invalid
-        if not valid_12_digit(aadhaar_info.get('Aadhaar Number', '')):
-            aadhaar_info['Aadhaar Number'] = aadhaar_from_text
-
-        if not valid_16_digit(aadhaar_info.get('VID', '')):
-            aadhaar_info['VID'] = vid_from_text
-
-        if check_duplicate(aadhaar_info.get('Aadhaar Number', ''), aadhaar_info.get('VID', '')):
-            return {
-                "status": "exists",
-                "message": "Aadhaar Number or VID already exists in the records."
+                "message": str(e),
+                "raw_response": e.raw
             }
 
-        save_to_csv(payload.user_id, aadhaar_info)
-
+    with stage("save", "csv"), csv_lock:
+        duplicate = check_duplicate(aadhaar_info.get('Aadhaar Number', ''), aadhaar_info.get('VID', ''))
+        if not duplicate:
+            save_to_csv(payload.user_id, aadhaar_info)
+    if duplicate:
+        DUPLICATES.inc()
         return {
-            "status": "saved",
-            "data": {**aadhaar_info, "User ID": payload.user_id}
+            "status": "exists",
+            "message": "Aadhaar Number or VID already exists in the records."
         }
 
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+    return {
+        "status": "saved",
+        "data": {**aadhaar_info, "User ID": payload.user_id}
+    }
@@ -0,0 +1,128 @@
+# card_converter.py
+# docling set up to read one photographed ID card, not multi-page documents.
+import os
+from collections import namedtuple
+
+from docling.datamodel.accelerator_options import AcceleratorOptions
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, ImageFormatOption
+from docling_core.types.doc import TextItem
+
+# bbox is (left, top, right, bottom) in pixels of the converted image
+CardLine = namedtuple("CardLine", ["text", "bbox"])
+
+# Off: none of these find anything on a card, and each is a model run
+_UNUSED_STAGES = (
+    "do_table_structure",
+    "do_code_enrichment",
+    "do_formula_enrichment",
+    "do_picture_classification",
+    "do_picture_description",
+    "do_chart_extraction",
+    "generate_page_images",
+    "generate_picture_images",
+    "generate_table_images",
+)
+
+
+def build_card_converter(num_threads: int = None) -> DocumentConverter:
+    """Converter for single card images: layout + full-page OCR only, on CPU
+    with an explicit thread count (DOCLING_NUM_THREADS, else 4)."""
+    if num_threads is None:
+        num_threads = int(os.getenv("DOCLING_NUM_THREADS", "4"))
+    opts = PdfPipelineOptions()
+    for name in _UNUSED_STAGES:
+        if hasattr(opts, name):  # not every docling release has every stage
+            setattr(opts, name, False)
+    opts.do_ocr = True
+    # A photo has no text layer; OCR the whole page, not just bitmap regions
+    opts.ocr_options.force_full_page_ocr = True
+    if hasattr(opts, "generate_parsed_pages"):
+        opts.generate_parsed_pages = True  # keep the OCR text cells for card_lines()
+    opts.accelerator_options = AcceleratorOptions(num_threads=max(1, num_threads), device="cpu")
+    return DocumentConverter(
+        allowed_formats=[InputFormat.IMAGE],
+        format_options={InputFormat.IMAGE: ImageFormatOption(pipeline_options=opts)},
+    )
+
+
+def group_cells(cells, y_tol=0.5, gap_tol=2.5) -> list:
+    """Join OCR cells into text lines, top to bottom, each read left to right.
+
+    The rule of OCR/line_grouping.group_lines on axis-aligned boxes: a cell
+    joins the row band whose centre is within y_tol heights of its own, so
+    cells a pixel or two apart never swap order, and a band is cut wherever
+    the gap to the next cell exceeds gap_tol heights (photo vs text column)."""
+    bands = []  # [cy, height, [cells]]
+    for cell in sorted(cells, key=lambda c: (c.bbox[1] + c.bbox[3]) / 2):
+        cy, h = (cell.bbox[1] + cell.bbox[3]) / 2, max(cell.bbox[3] - cell.bbox[1], 1.0)
+        best = None
+        for band in bands:
+            dy = abs(band[0] - cy)
+            if dy <= y_tol * max(band[1], h) and (best is None or dy < best[0]):
+                best = (dy, band)
+        if best is None:
+            bands.append([cy, h, [cell]])
+            continue
+        band = best[1]
+        n = len(band[2])
+        band[0] = (band[0] * n + cy) / (n + 1)
+        band[1] = (band[1] * n + h) / (n + 1)
+        band[2].append(cell)
+
+    lines = []
+    for _, height, band_cells in sorted(bands, key=lambda b: b[0]):
+        band_cells.sort(key=lambda c: c.bbox[0])
+        line = [band_cells[0]]
+        for cell in band_cells[1:]:
+            if cell.bbox[0] - max(c.bbox[2] for c in line) > gap_tol * height:
+                lines.append(_join(line))
+                line = []
+            line.append(cell)
+        lines.append(_join(line))
+    return lines
+
+
+def _join(cells) -> CardLine:
+    return CardLine(" ".join(c.text for c in cells), (
+        min(c.bbox[0] for c in cells), min(c.bbox[1] for c in cells),
+        max(c.bbox[2] for c in cells), max(c.bbox[3] for c in cells),
+    ))
+
+
+def card_lines(result, image_size=None) -> list:
+    """Text lines of a converted card, top to bottom, with pixel bboxes.
+
+    Uses the page's OCR text cells, so text the layout model filed under a
+    table or picture is not dropped; falls back to the document's text items
+    when the cells were not kept. Cells on one row are joined by group_cells."""
+    cells = []
+    for page in result.pages:
+        if page.size is None:
+            continue
+        height = page.size.height
+        # Page coordinates are in points; map them onto the image we passed in
+        scale = image_size[0] / page.size.width if image_size else 1.0
+        for cell in page.cells:
+            text = cell.text.strip()
+            if not text:
+                continue
+            box = cell.rect.to_bounding_box().to_top_left_origin(height)
+            cells.append(CardLine(text, tuple(round(v * scale, 1) for v in (box.l, box.t, box.r, box.b))))
+    if not cells:
+        pages = result.document.pages
+        for item, _ in result.document.iterate_items():
+            if not isinstance(item, TextItem) or not item.text.strip() or not item.prov:
+                continue
+            prov = item.prov[0]
+            size = pages[prov.page_no].size
+            scale = image_size[0] / size.width if image_size else 1.0
+            box = prov.bbox.to_top_left_origin(size.height)
+            cells.append(CardLine(item.text.strip(), tuple(round(v * scale, 1) for v in (box.l, box.t, box.r, box.b))))
+    return group_cells(cells)
+
+
+def lines_text(lines) -> str:
+    """One line of text per OCR line, the shape extract_info() expects."""
+    return "\n".join(line.text for line in lines)
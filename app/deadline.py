@@ -0,0 +1,122 @@
+# deadline.py
+# One time budget per request, shared by every pipeline stage.
+import os
+import time
+import asyncio
+import contextvars
+
+from fastapi import HTTPException
+
+from metrics import DEADLINE_EXCEEDED
+
+# Set for the duration of a request; run_in_threadpool carries it into the
+# blocking stages, like profiling.active_profile
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+DISCONNECT_POLL = 0.5
+
+
+class DeadlineExceeded(HTTPException):
+    """504 (or 499 after a disconnect) caused by one request's own budget.
+    Requests coalesced onto it retry instead of inheriting the error."""
+
+
+class Deadline:
+    """Absolute monotonic expiry. Stages ask for what is left; cancel() ends
+    the budget early so work still running in a thread stops at its next check."""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+        self.reason = "deadline"
+
+    @classmethod
+    def from_header(cls, header: str = None) -> "Deadline":
+        """X-Request-Timeout seconds, else REQUEST_TIMEOUT (120); capped at REQUEST_TIMEOUT_MAX (300)."""
+        default = float(os.getenv("REQUEST_TIMEOUT", "120"))
+        cap = float(os.getenv("REQUEST_TIMEOUT_MAX", "300"))
+        try:
+            budget = float(header) if header else default
+        except ValueError:
+            raise HTTPException(status_code=422, detail="X-Request-Timeout must be a number of seconds")
+        if budget <= 0:
+            raise HTTPException(status_code=422, detail="X-Request-Timeout must be positive")
+        return cls(min(budget, cap))
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def cancel(self, reason: str):
+        self.reason = reason
+        self.expires = time.monotonic()
+
+    def check(self, stage: str):
+        if self.remaining() <= 0:
+            self.exceeded(stage)
+
+    def exceeded(self, stage: str):
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        if self.reason == "disconnect":
+            raise DeadlineExceeded(status_code=499, detail="Client closed request")
+        raise DeadlineExceeded(status_code=504, detail=f"Request deadline of {self.budget:g}s exceeded at {stage}")
+
+
+# === Helpers for stage code; all are no-ops outside a request ===
+def check(stage: str):
+    deadline = current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def exceeded(stage: str):
+    deadline = current_deadline.get()
+    if deadline is None:
+        raise DeadlineExceeded(status_code=504, detail=f"Timed out at {stage}")
+    deadline.exceeded(stage)
+
+
+def remaining(default: float = None) -> float:
+    deadline = current_deadline.get()
+    return default if deadline is None else deadline.remaining()
+
+
+def timeout(cap: float = None, reserve: float = 0, floor: float = 0.1) -> float:
+    """Seconds a blocking call may take: what is left minus `reserve` for the
+    stages after it, at most `cap`. None when there is no deadline or cap."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return cap
+    left = max(floor, deadline.remaining() - reserve)
+    return left if cap is None else min(cap, left)
+
+
+async def run_within(deadline: Deadline, request, coro, stage: str = "request"):
+    """Await coro under the deadline. If the budget runs out or the client
+    disconnects, the awaiting task is cancelled and the deadline is cancelled
+    too, so threadpool stages stop at their next check()."""
+    token = current_deadline.set(deadline)
+    try:
+        task = asyncio.ensure_future(coro)  # copies the context, deadline included
+    finally:
+        current_deadline.reset(token)
+
+    async def watch():
+        while not task.done():
+            if await request.is_disconnected():
+                deadline.cancel("disconnect")
+                task.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL)
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        return await asyncio.wait_for(task, timeout=max(0, deadline.remaining()))
+    except asyncio.TimeoutError:
+        deadline.cancel("deadline")
+        deadline.exceeded(stage)
+    except asyncio.CancelledError:
+        if deadline.reason == "disconnect":
+            deadline.exceeded("disconnect")
+        raise
+    finally:
+        watcher.cancel()
@@ -0,0 +1,257 @@
+# extraction.py
+# Field extractors that turn OCR text into a record. Kept free of the API
+# apps' startup work (models, Redis, OpenAI client) so replay.py can import
+# them cheaply.
+import re
+import json
+
+
+# === Regex extractor (main.py) ===
+def extract_info(front_text: str, back_text: str = None):
+    # Aadhaar Number (12 digits, with or without spaces) - search both front and back
+    aadhaar_match = re.search(r"\b\d{4} ?\d{4} ?\d{4}\b", front_text)
+    if not aadhaar_match and back_text:
+        aadhaar_match = re.search(r"\b\d{4} ?\d{4} ?\d{4}\b", back_text)
+    aadhaar_number = aadhaar_match.group(0).replace(" ", "") if aadhaar_match else None
+
+    # Clean lines
+    lines = [line.strip() for line in front_text.split("\n") if line.strip()]
+
+    # Name: Try to extract from line containing gender, or from back_text if not found
+    name = None
+    skip_words = ["government of india", "republic of india", "unique identification", "authority", "aadhaar", "card", "male", "female", "dob", "year of birth", "address", "vid", "father", "mother", "image", "govt", "govt. of india"]
+    # 1. Look for name in line with gender
+    for i, line in enumerate(lines):
+        if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
+            # Remove gender word and try to extract name
+            possible = re.sub(r"\b(male|female|पुरुष|महिला)\b", "", line, flags=re.IGNORECASE).strip()
+            if possible and not any(w in possible.lower() for w in skip_words):
+                name = possible
+                break
+    # 2. If not found, look for first valid line after gender line
+    if not name:
+        for i, line in enumerate(lines):
+            if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
+                if i+1 < len(lines):
+                    possible = lines[i+1]
+                    if not any(w in possible.lower() for w in skip_words) and len(possible.split()) >= 2:
+                        name = possible
+                        break
+    # 3. If still not found, try back_text
+    if not name and back_text:
+        back_lines = [line.strip() for line in back_text.split("\n") if line.strip()]
+        for i, line in enumerate(back_lines):
+            if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
+                possible = re.sub(r"\b(male|female|पुरुष|महिला)\b", "", line, flags=re.IGNORECASE).strip()
+                if possible and not any(w in possible.lower() for w in skip_words):
+                    name = possible
+                    break
+        if not name:
+            for i, line in enumerate(back_lines):
+                if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
+                    if i+1 < len(back_lines):
+                        possible = back_lines[i+1]
+                        if not any(w in possible.lower() for w in skip_words) and len(possible.split()) >= 2:
+                            name = possible
+                            break
+    # 4. Fallback: first valid line in front_text
+    if not name:
+        for line in lines:
+            lcline = line.lower()
+            if any(w in lcline for w in skip_words):
+                continue
+            if len(line.split()) >= 2 and re.match(r"^[A-Za-z .'-]+$", line):
+                name = line.strip()
+                break
+
+    # Gender: look for gender words near DOB or Aadhaar number
+    gender = None
+    for i, line in enumerate(lines):
+        if re.search(r"\bmale\b|पुरुष", line, re.IGNORECASE):
+            gender = "Male"
+            break
+        elif re.search(r"\bfemale\b|महिला", line, re.IGNORECASE):
+            gender = "Female"
+            break
+
+    # === Extract VID ===
+    vid_matches = re.findall(r"(?:VID[:;]?\s*)(\d{4} \d{4} \d{4} \d{4})", front_text)
+    if not vid_matches:
+        vid_matches = re.findall(r"\b\d{4} \d{4} \d{4} \d{4}\b", front_text)
+    if back_text and not vid_matches:
+        vid_matches = re.findall(r"(?:VID[:;]?\s*)(\d{4} \d{4} \d{4} \d{4})", back_text)
+        if not vid_matches:
+            vid_matches = re.findall(r"\b\d{4} \d{4} \d{4} \d{4}\b", back_text)
+    vid = vid_matches[0] if vid_matches else None
+
+    # === Extract Pincode ===
+    pincode_match = re.search(r'\b\d{6}\b', front_text)
+    if not pincode_match and back_text:
+        pincode_match = re.search(r'\b\d{6}\b', back_text)
+    pincode = pincode_match.group(0) if pincode_match else None
+
+    address = None
+    if back_text:
+        back_lines = [line.strip() for line in back_text.split("\n") if line.strip()]
+        for i, line in enumerate(back_lines):
+            if re.search(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]', line, re.IGNORECASE):
+                address_lines = [line]
+                for j in range(i + 1, min(i + 6, len(back_lines))):
+                    address_lines.append(back_lines[j])
+                    if re.search(r'\b\d{6}\b', back_lines[j]):
+                        break
+                address_text = " ".join(address_lines)
+                address_text = re.sub(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]*', '', address_text, flags=re.IGNORECASE)
+                address = address_text.strip()
+                break
+        if not address:
+            addr_start, addr_end = -1, -1
+            for i, line in enumerate(back_lines):
+                if addr_start == -1 and re.search(r'address', line, re.IGNORECASE):
+                    addr_start = i + 1
+                if addr_start != -1 and re.search(r'\b\d{6}\b', line):
+                    addr_end = i
+                    break
+            if addr_start != -1 and addr_end > addr_start:
+                address = ' '.join(back_lines[addr_start:addr_end]).strip()
+    if not address:
+        for i, line in enumerate(lines):
+            if re.search(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]', line, re.IGNORECASE):
+                address_lines = [line]
+                for j in range(i + 1, min(i + 5, len(lines))):
+                    address_lines.append(lines[j])
+                    if re.search(r'\b\d{6}\b', lines[j]):
+                        break
+                address_text = " ".join(address_lines)
+                address_text = re.sub(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]*', '', address_text, flags=re.IGNORECASE)
+                address = address_text.strip()
+                break
+        if not address:
+            addr_start, addr_end = -1, -1
+            for i, line in enumerate(lines):
+                if addr_start == -1 and re.search(r'address', line, re.IGNORECASE):
+                    addr_start = i + 1
+                if addr_start != -1 and re.search(r'\b\d{6}\b', line):
+                    addr_end = i
+                    break
+            if addr_start != -1 and addr_end > addr_start:
+                address = ' '.join(lines[addr_start:addr_end]).strip()
+    # Removed 422 error for missing Aadhaar number
+    return {
+        "Name": name,
+        "Gender": gender,
+        "Aadhaar Number": aadhaar_number,
+        "VID": vid,
+        "Address": address,
+        "Pincode": pincode,
+    }
+
+
+# === LLM extractor (app.py) ===
+def clean_response(text: str) -> str:
+    # Remove Markdown-style code block wrappers
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE)
+    return cleaned.strip()
+
+def find_all_aadhaar_vid(text):
+    """
+    Extract Aadhaar number and VID from text using regex.
+    Returns tuple (aadhaar_number, vid)
+    """
+    # Aadhaar: 12 digits, usually grouped in 4-4-4 or continuous digits
+    aadhaar_pattern = re.compile(r'\b\d{4}\s?\d{4}\s?\d{4}\b')
+    # VID: 16 digits, possibly grouped in 4s with spaces
+    vid_pattern = re.compile(r'\b\d{4}\s?\d{4}\s?\d{4}\s?\d{4}\b')
+
+    aadhaar_match = aadhaar_pattern.search(text.replace('\n', ' '))
+    vid_match = vid_pattern.search(text.replace('\n', ' '))
+
+    aadhaar_number = aadhaar_match.group().replace(' ', '') if aadhaar_match else ""
+    vid = vid_match.group().replace(' ', '') if vid_match else ""
+
+    return aadhaar_number, vid
+
+def valid_12_digit(s):
+    return bool(re.fullmatch(r'\d{12}', s))
+
+def valid_16_digit(s):
+    return bool(re.fullmatch(r'\d{16}', s))
+
+class LLMResponseError(ValueError):
+    """The model did not answer with JSON; `raw` holds what it said."""
+
+    def __init__(self, raw: str):
+        super().__init__("Failed to parse JSON from GPT response.")
+        self.raw = raw
+
+def llm_messages(combined_text: str) -> list:
+    messages = [
+        {
+            "role": "system",
+            "content": """
+You are an assistant extracting Aadhaar card information from OCR text. 
+Extract the following Aadhaar fields from this text:
+- Name
+- Date of Birth (DOB)
+- Gender
+- Aadhaar Number (exact 12 digits)
+- VID Number (exact 16 digits)
+- Address
+- Pincode
+- Aadhaar Number must be exactly 12 digits, no letters or spaces.
+- VID must be exactly 16 digits.
+- Return JSON only.
+- If you cannot find the exact value, return empty string "" for that field.
+"""
+        },
+        {
+            "role": "system",
+            "content": f"""
+Extract the following Aadhaar fields from this text:
+- Name
+- Date of Birth (DOB)
+- Gender
+- Aadhaar Number (exact 12 digits)
+- VID Number (exact 16 digits)
+- Address
+- Pincode
+
+Text:
+\"\"\"
+{combined_text}
+\"\"\"
+
+Return result as a JSON object only:
+{{"Name": "...", "DOB": "...", "Gender": "...", "Aadhaar Number": "...", "VID": "...", "Address": "...", "Pincode": "..."}}
+                """
+        }
+    ]
+    return messages
+
+def llm_extract(client, combined_text: str, model: str = "gpt-4o-mini") -> dict:
+    """Ask the model for the fields, then check the numbers against the OCR text."""
+    response = client.chat.completions.create(
+        model=model,
+        messages=llm_messages(combined_text),
+        temperature=0,
+        max_tokens=500,
+    )
+
+    answer_text = response.choices[0].message.content
+    cleaned_text = clean_response(answer_text)
+
+    try:
+        aadhaar_info = json.loads(cleaned_text)
+    except json.JSONDecodeError:
+        raise LLMResponseError(answer_text)
+
+    # Extract Aadhaar and VID from OCR text as fallback
+    aadhaar_from_text, vid_from_text = find_all_aadhaar_vid(combined_text)
+
+    # Validate and replace GPT output if invalid
+    if not valid_12_digit(aadhaar_info.get('Aadhaar Number', '')):
+        aadhaar_info['Aadhaar Number'] = aadhaar_from_text
+
+    if not valid_16_digit(aadhaar_info.get('VID', '')):
+        aadhaar_info['VID'] = vid_from_text
+    return aadhaar_info
@@ -3,22 +3,44 @@ os.environ["CUDA_VISIBLE_DEVICES"] = ""
 
 # main.py
 import io
-import re
-import csv
-import pickle
+import math
+import hashlib
 import logging
+import tempfile
+import threading
 import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Query
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import List, Optional
 from PIL import Image
 import requests
 import redis
 from dotenv import load_dotenv
-from docling_core.types.io import DocumentStream  # Add this import at the top
 
-from docling.document_converter import DocumentConverter  # OCR & layout
+
+from metrics import stage, metrics_response, mark_worker_dead, set_redis_up, CACHE_HITS, UPSCALE_FAILURES, IN_FLIGHT, REQUEST_LATENCY, DEGRADED
+from profiling import Profiler, call_profiled
+from admission import AdmissionController
+import deadline
+from deadline import Deadline, run_within
+from singleflight import SingleFlight
+from orientation import normalize_orientation
+from shm_transport import shared_images, sweep_stale
+from phash import PerceptualIndex, card_hash, number_reader_available, read_number
+from records import iter_pickle_records, lookup_redis, lookup_records, redis_from_env
+from persistence import Persister
+from pdf_input import fetch_pdf, read_pdf_card, PdfInputError
+from extraction import extract_info
+from ocr_corpus import OcrCorpus
+import ocr_engines
+from ocr_engines import MAX_SIDE, ocr_image, ocr_shared
+from modes import PipelineProfiles, PipelineProfile, EngineUnavailable
 load_dotenv()
 
 # === Setup ===
@@ -27,270 +49,422 @@ logging.basicConfig(level=logging.INFO)
 
 # === Redis Client ===
 try:
-    r = redis.Redis(
-        host="localhost",
-        port="6379",
-        username="default",
-        password="hqpl@123",
-        decode_responses=True
-    )
+    # REDIS_HOST / REDIS_PORT / REDIS_USERNAME / REDIS_PASSWORD, shared with records.py
+    r = redis_from_env()
     r.ping()
     logging.info("✅ Redis connected")
+    set_redis_up(True)
 except Exception as e:
     logging.error("❌ Redis unavailable")
+    set_redis_up(False)
     r = None
 
 csv_path = "./aadhaar_data.csv"
 pkl_path = "./aadhaar_data.pkl"
-converter = DocumentConverter()  # load docling model :contentReference[oaicite:1]{index=1}
+# Upscayl's fixed scale; smaller inputs than max_side / 2 are the only ones worth it
+UPSCALE_FACTOR = 2
+# Per-request speed/accuracy tiers (fast / balanced / accurate, PIPELINE_PROFILES to tune)
+modes = PipelineProfiles.from_env()
+# Deadline budget (X-Request-Timeout / REQUEST_TIMEOUT): upscaling is skipped
+# with less than UPSCALE_MIN_BUDGET seconds left, and never eats into the
+# OCR_RESERVE seconds kept for OCR
+UPSCALE_MIN_BUDGET = float(os.getenv("UPSCALE_MIN_BUDGET", "30"))
+OCR_RESERVE = float(os.getenv("OCR_RESERVE", "15"))
+# Most keys (numbers + VIDs + user IDs) one /records call may look up
+RECORDS_MAX_KEYS = int(os.getenv("RECORDS_MAX_KEYS", "1000"))
+# Opt-in profiling: PROFILE_ALLOWLIST user IDs that also send "X-Profile: 1"
+profiler = Profiler.from_env()
+# OCR_CONCURRENCY slots, OCR_QUEUE_SIZE waiters, 429 beyond that
+admission = AdmissionController.from_env()
+# Layout + OCR only; the CPU is split between the concurrent OCR slots
+DOCLING_NUM_THREADS = int(os.getenv("DOCLING_NUM_THREADS", "0")) or max(1, (os.cpu_count() or 1) // admission.limit)
+ocr_engines.configure(DOCLING_NUM_THREADS)
+ocr_engines.get_converter()
+# Identical concurrent requests share one pipeline run (across workers via Redis)
+flights = SingleFlight(r)
+# OCR_WORKERS > 0 runs docling in a process pool; images travel via shared memory
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+ocr_pool = None
+ocr_pool_lock = threading.Lock()
+# Batched, fsynced writes of accepted records (PERSIST_MODE=group|async)
+persister = Persister.from_env(pkl_path, csv_path, r)
+# OCR_RECORD_DIR keeps every OCR result for replay.py regression runs
+ocr_corpus = OcrCorpus.from_env()
+# Resubmissions of an accepted card are answered without full OCR: a photo +
+# number region fingerprint finds the candidate, and the number read from
+# the card's number strip alone must equal it (PHASH_ENABLED=0 turns it off)
+phash_index = None
+if os.getenv("PHASH_ENABLED", "1") == "1":
+    if number_reader_available():
+        phash_index = PerceptualIndex(
+            os.getenv("PHASH_INDEX_PATH", "./phash_index.txt"),
+            max_distance=int(os.getenv("PHASH_MAX_DISTANCE", "12")),
+            redis_client=r,
+        )
+    else:
+        logging.warning("Tesseract not installed: perceptual matches cannot be confirmed, phash index disabled")
+
+class RecordsRequest(BaseModel):
+    aadhaar: List[str] = []
+    vid: List[str] = []
+    user_id: List[str] = []
 
 class AadhaarRequest(BaseModel):
     user_id: str
-    front_url: str
-    back_url: str
+    front_url: Optional[str] = None
+    back_url: Optional[str] = None
+    # e-Aadhaar PDF instead of the two photos
+    pdf_url: Optional[str] = None
+    pdf_password: Optional[str] = None
+    mode: Optional[str] = None  # pipeline profile; None uses PIPELINE_MODE
+
+def download_image(url: str, max_side: int = MAX_SIDE) -> Image.Image:
+    return open_image(fetch_bytes(url), max_side)
 
-def download_image(url: str) -> Image.Image:
-    resp = requests.get(url, timeout=10)
+def fetch_bytes(url: str) -> bytes:
+    resp = requests.get(url, timeout=deadline.timeout(10))
     resp.raise_for_status()
-    return Image.open(io.BytesIO(resp.content))
+    return resp.content
+
+def open_image(data: bytes, max_side: int = MAX_SIDE) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    decode_reduced(img, max_side)
+    return img
+
+def decode_reduced(img: Image.Image, max_side: int):
+    """Ask the JPEG decoder to scale in the DCT domain (1/2, 1/4, 1/8) so a
+    12MP photo decodes close to max_side instead of at full resolution.
+    Must run before the pixels are loaded; a no-op for other formats."""
+    w, h = img.size
+    if img.format != "JPEG" or max(w, h) <= max_side:
+        return
+    scale = max_side / float(max(w, h))
+    # draft() picks the smallest scale that still covers the requested size
+    img.draft("RGB", (math.ceil(w * scale), math.ceil(h * scale)))
 
 def upscale_image(pil_img: Image.Image, hint: str) -> Image.Image:
-    inp = f"/tmp/{hint}_in.png"
-    out_dir = "/tmp"
-    pil_img.save(inp)
-    try:
-        subprocess.run([
-            "upscayl", "--input", inp, "--output", out_dir,
-            "--scale", "2", "--mode", "real-esrgan"
-        ], check=True)
-        # find upscaled
-        for f in os.listdir(out_dir):
-            if f.startswith(hint) and f.endswith(".png"):
-                return Image.open(os.path.join(out_dir, f))
-    except Exception as e:
-        logging.warning(f"Upscayl failed: {e}")
+    # Private work dir per call: requests now upscale concurrently
+    with tempfile.TemporaryDirectory(prefix=f"{hint}_") as out_dir:
+        inp = os.path.join(out_dir, f"{hint}_in.png")
+        pil_img.save(inp)
+        try:
+            subprocess.run([
+                "upscayl", "--input", inp, "--output", out_dir,
+                "--scale", str(UPSCALE_FACTOR), "--mode", "real-esrgan"
+            ], check=True, timeout=deadline.timeout(reserve=OCR_RESERVE))
+            # find upscaled
+            for f in os.listdir(out_dir):
+                if f.startswith(hint) and f.endswith(".png") and f != os.path.basename(inp):
+                    upscaled = Image.open(os.path.join(out_dir, f))
+                    upscaled.load()  # read before the directory is removed
+                    return upscaled
+        except Exception as e:
+            logging.warning(f"Upscayl failed: {e}")
+    UPSCALE_FAILURES.inc()
     return pil_img
 
-def extract_text_from_image(img: Image.Image) -> str:
-    # Resize image to max 1200px on the longest side before OCR
-    max_side = 1200
-    w, h = img.size
-    if max(w, h) > max_side:
-        scale = max_side / float(max(w, h))
-        new_size = (int(w * scale), int(h * scale))
-        img = img.resize(new_size, Image.LANCZOS)
-    # save PIL as bytes for docling: it accepts path or stream
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    doc_stream = DocumentStream(name="input.png", stream=buf)
-    result = converter.convert(doc_stream)
-    return result.document.export_to_markdown()
-
-def extract_info(front_text: str, back_text: str = None):
-    # Aadhaar Number (12 digits, with or without spaces) - search both front and back
-    aadhaar_match = re.search(r"\b\d{4} ?\d{4} ?\d{4}\b", front_text)
-    if not aadhaar_match and back_text:
-        aadhaar_match = re.search(r"\b\d{4} ?\d{4} ?\d{4}\b", back_text)
-    aadhaar_number = aadhaar_match.group(0).replace(" ", "") if aadhaar_match else None
-
-    # Clean lines
-    lines = [line.strip() for line in front_text.split("\n") if line.strip()]
-
-    # Name: Try to extract from line containing gender, or from back_text if not found
-    name = None
-    skip_words = ["government of india", "republic of india", "unique identification", "authority", "aadhaar", "card", "male", "female", "dob", "year of birth", "address", "vid", "father", "mother", "image", "govt", "govt. of india"]
-    # 1. Look for name in line with gender
-    for i, line in enumerate(lines):
-        if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
-            # Remove gender word and try to extract name
-            possible = re.sub(r"\b(male|female|पुरुष|महिला)\b", "", line, flags=re.IGNORECASE).strip()
-            if possible and not any(w in possible.lower() for w in skip_words):
-                name = possible
-                break
-    # 2. If not found, look for first valid line after gender line
-    if not name:
-        for i, line in enumerate(lines):
-            if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
-                if i+1 < len(lines):
-                    possible = lines[i+1]
-                    if not any(w in possible.lower() for w in skip_words) and len(possible.split()) >= 2:
-                        name = possible
-                        break
-    # 3. If still not found, try back_text
-    if not name and back_text:
-        back_lines = [line.strip() for line in back_text.split("\n") if line.strip()]
-        for i, line in enumerate(back_lines):
-            if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
-                possible = re.sub(r"\b(male|female|पुरुष|महिला)\b", "", line, flags=re.IGNORECASE).strip()
-                if possible and not any(w in possible.lower() for w in skip_words):
-                    name = possible
-                    break
-        if not name:
-            for i, line in enumerate(back_lines):
-                if re.search(r"\bmale\b|पुरुष|\bfemale\b|महिला", line, re.IGNORECASE):
-                    if i+1 < len(back_lines):
-                        possible = back_lines[i+1]
-                        if not any(w in possible.lower() for w in skip_words) and len(possible.split()) >= 2:
-                            name = possible
-                            break
-    # 4. Fallback: first valid line in front_text
-    if not name:
-        for line in lines:
-            lcline = line.lower()
-            if any(w in lcline for w in skip_words):
-                continue
-            if len(line.split()) >= 2 and re.match(r"^[A-Za-z .'-]+$", line):
-                name = line.strip()
-                break
-
-    # Gender: look for gender words near DOB or Aadhaar number
-    gender = None
-    for i, line in enumerate(lines):
-        if re.search(r"\bmale\b|पुरुष", line, re.IGNORECASE):
-            gender = "Male"
-            break
-        elif re.search(r"\bfemale\b|महिला", line, re.IGNORECASE):
-            gender = "Female"
-            break
-
-    # === Extract VID ===
-    vid_matches = re.findall(r"(?:VID[:;]?\s*)(\d{4} \d{4} \d{4} \d{4})", front_text)
-    if not vid_matches:
-        vid_matches = re.findall(r"\b\d{4} \d{4} \d{4} \d{4}\b", front_text)
-    if back_text and not vid_matches:
-        vid_matches = re.findall(r"(?:VID[:;]?\s*)(\d{4} \d{4} \d{4} \d{4})", back_text)
-        if not vid_matches:
-            vid_matches = re.findall(r"\b\d{4} \d{4} \d{4} \d{4}\b", back_text)
-    vid = vid_matches[0] if vid_matches else None
-
-    # === Extract Pincode ===
-    pincode_match = re.search(r'\b\d{6}\b', front_text)
-    if not pincode_match and back_text:
-        pincode_match = re.search(r'\b\d{6}\b', back_text)
-    pincode = pincode_match.group(0) if pincode_match else None
-
-    address = None
-    if back_text:
-        back_lines = [line.strip() for line in back_text.split("\n") if line.strip()]
-        for i, line in enumerate(back_lines):
-            if re.search(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]', line, re.IGNORECASE):
-                address_lines = [line]
-                for j in range(i + 1, min(i + 6, len(back_lines))):
-                    address_lines.append(back_lines[j])
-                    if re.search(r'\b\d{6}\b', back_lines[j]):
-                        break
-                address_text = " ".join(address_lines)
-                address_text = re.sub(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]*', '', address_text, flags=re.IGNORECASE)
-                address = address_text.strip()
-                break
-        if not address:
-            addr_start, addr_end = -1, -1
-            for i, line in enumerate(back_lines):
-                if addr_start == -1 and re.search(r'address', line, re.IGNORECASE):
-                    addr_start = i + 1
-                if addr_start != -1 and re.search(r'\b\d{6}\b', line):
-                    addr_end = i
-                    break
-            if addr_start != -1 and addr_end > addr_start:
-                address = ' '.join(back_lines[addr_start:addr_end]).strip()
-    if not address:
-        for i, line in enumerate(lines):
-            if re.search(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]', line, re.IGNORECASE):
-                address_lines = [line]
-                for j in range(i + 1, min(i + 5, len(lines))):
-                    address_lines.append(lines[j])
-                    if re.search(r'\b\d{6}\b', lines[j]):
-                        break
-                address_text = " ".join(address_lines)
-                address_text = re.sub(r'(?:C/O|~/O|S/O|W/O|D/O|H/O)[:\s]*', '', address_text, flags=re.IGNORECASE)
-                address = address_text.strip()
-                break
-        if not address:
-            addr_start, addr_end = -1, -1
-            for i, line in enumerate(lines):
-                if addr_start == -1 and re.search(r'address', line, re.IGNORECASE):
-                    addr_start = i + 1
-                if addr_start != -1 and re.search(r'\b\d{6}\b', line):
-                    addr_end = i
-                    break
-            if addr_start != -1 and addr_end > addr_start:
-                address = ' '.join(lines[addr_start:addr_end]).strip()
-    # Removed 422 error for missing Aadhaar number
-    return {
-        "Name": name,
-        "Gender": gender,
-        "Aadhaar Number": aadhaar_number,
-        "VID": vid,
-        "Address": address,
-        "Pincode": pincode,
-    }
+def get_ocr_pool() -> ProcessPoolExecutor:
+    # Created on first use. Spawned workers import only ocr_engines (the
+    # entry point's module), not this one with its Redis and record store
+    global ocr_pool
+    with ocr_pool_lock:
+        if ocr_pool is None:
+            sweep_stale()
+            ocr_pool = ProcessPoolExecutor(OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=ocr_engines.configure, initargs=(DOCLING_NUM_THREADS,))
+        return ocr_pool
+
+def ocr_in_pool(*images, engine: str = "docling", max_side: int = MAX_SIDE, timeout: float = None) -> tuple:
+    global ocr_pool
+    pool = get_ocr_pool()
+    # Segments are unlinked here on exit, even if the worker died mid-job
+    with shared_images(*images) as handles:
+        try:
+            job = pool.submit(ocr_shared, handles, engine, max_side, timeout)
+            try:
+                return job.result(timeout=timeout)
+            except TimeoutError:
+                job.cancel()  # drops it if a worker has not picked it up yet
+                raise
+        except BrokenProcessPool:
+            with ocr_pool_lock:
+                if ocr_pool is pool:
+                    ocr_pool = None  # replaced on the next request
+            raise HTTPException(status_code=503, detail="OCR worker crashed", headers={"Retry-After": "1"})
 
 def save_data(info: dict) -> bool:
-    # same logic as yours
-    try:
-        if os.path.exists(pkl_path):
-            with open(pkl_path, 'rb') as f:
-                all_data = pickle.load(f)
-        else:
-            all_data = []
-
-        existing_aadhaars = [entry['Aadhaar Number'] for entry in all_data if 'Aadhaar Number' in entry]
-        if info['Aadhaar Number'] in existing_aadhaars:
-            logging.info(f"⚠️ Aadhaar {info['Aadhaar Number']} already exists.")
-            return False
-
-        all_data.append(info)
-        with open(pkl_path, 'wb') as f:
-            pickle.dump(all_data, f)
-
-        file_exists = os.path.exists(csv_path)
-        with open(csv_path, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=info.keys())
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(info)
-
-        if r:
-            redis_key = f"aadhaar:{info['Aadhaar Number']}"
-            filtered_info = {k: v for k, v in info.items() if v is not None}
-            r.hset(redis_key, mapping=filtered_info)
-            logging.info(f"✅ Data saved to Redis under key: {redis_key}")
-        return True
-    except Exception as e:
-        logging.error("❌ Error while saving data:")
-        logging.error(e)
-        return False
+    """Claim the Aadhaar number and hand the record to the write-behind
+    persister; see persistence.py for what "saved" guarantees per PERSIST_MODE."""
+    return persister.save(info)
+
+def load_record(aadhaar_number: str):
+    """Fetch a stored record by Aadhaar number from Redis, falling back to the pickle."""
+    if r:
+        try:
+            record = r.hgetall(f"aadhaar:{aadhaar_number}")
+            if record:
+                return record
+        except redis.exceptions.RedisError:
+            set_redis_up(False)
+    if os.path.exists(pkl_path):
+        for entry in iter_pickle_records(pkl_path):
+            if entry.get('Aadhaar Number') == aadhaar_number:
+                return entry
+    return None
+
+async def offload(fn, *args):
+    """Run a blocking pipeline step in the threadpool so the event loop stays free."""
+    return await run_in_threadpool(call_profiled, fn, *args)
 
 @app.post("/upload_url")
-async def upload_via_url(req: AadhaarRequest):
+async def upload_via_url(req: AadhaarRequest, request: Request, x_profile: Optional[str] = Header(None),
+                         x_request_timeout: Optional[str] = Header(None)):
+    try:
+        mode = modes.get(req.mode)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown mode {req.mode!r}; expected one of {modes.names()}")
+    if not req.pdf_url and not (req.front_url and req.back_url):
+        raise HTTPException(status_code=422, detail="Send front_url and back_url, or pdf_url")
+    budget = Deadline.from_header(x_request_timeout)
+    with IN_FLIGHT.labels("upload_url").track_inprogress(), REQUEST_LATENCY.labels(mode.name).time():
+        # Cut off at the deadline or when the client goes away
+        return await run_within(budget, request, handle_upload(req, mode, x_profile))
+
+async def handle_upload(req: AadhaarRequest, mode: PipelineProfile, x_profile: Optional[str]):
+    profile = profiler.for_request(req.user_id, x_profile)
+    if profile is None:
+        # Double submits and client retries attach to the run already in flight.
+        # Per user: the run saves under, and replies with, the leader's user_id
+        key = f"url:{mode.name}:{req.user_id}\n{source_key(req)}"
+        return await flights.do(key, lambda: run_pipeline(req, mode))
+    # Profiled requests always run their own pipeline
+    with profile:
+        result = await run_pipeline(req, mode, coalesce=False)
+    if isinstance(result, dict):
+        result["profile"] = profile.summary()
+    return result
+
+def source_key(req: AadhaarRequest) -> str:
+    if req.pdf_url:
+        # Same URL with a wrong password must not share the run
+        secret = hashlib.sha256((req.pdf_password or "").encode()).hexdigest()[:16]
+        return f"pdf:{req.pdf_url}:{secret}"
+    return f"{req.front_url}\n{req.back_url}"
+
+async def run_pipeline(req: AadhaarRequest, mode: PipelineProfile, coalesce: bool = True):
+    if req.pdf_url:
+        texts, images, digest = await offload(download_pdf_card, req, mode.max_side)
+        if texts:
+            # Text layer read directly: no OCR, and nothing to fingerprint
+            result = await offload(finish_card, req, texts[0], texts[1], None)
+            if isinstance(result, dict):
+                result["mode"] = mode.name
+            return result
+        front, back = images
+        # Rendered upright at max_side already
+        mode = mode._replace(orient=False, upscale=False)
+    else:
+        front, back, digest = await offload(download_card, req, mode.max_side)
+    if not coalesce:
+        return await process_card(req, mode, front, back)
+    # Same images under different URLs (re-uploads, CDN variants), same user
+    return await flights.do(f"content:{mode.name}:{req.user_id}\n{digest}", lambda: process_card(req, mode, front, back))
+
+async def process_card(req: AadhaarRequest, mode: PipelineProfile, front: Image.Image, back: Image.Image):
+    fingerprint, cached = await offload(lookup_card, front, req.user_id)
+    if cached:
+        cached["mode"] = mode.name
+        return cached
+
+    # Only the CPU-bound upscale + OCR is gated; downloads and saves are not.
+    # Waiting for a slot never outlasts the request's own deadline, and a
+    # request cut off mid-OCR keeps its slot until the OCR thread returns.
+    front_txt, back_txt = await admission.run(lambda: offload(read_card, front, back, mode),
+                                              req.user_id, timeout=deadline.remaining())
+
+    result = await offload(finish_card, req, front_txt, back_txt, fingerprint)
+    if isinstance(result, dict):
+        result["mode"] = mode.name
+    return result
+
+def download_card(req: AadhaarRequest, max_side: int = MAX_SIDE):
+    """Download both sides; also returns a content digest of the raw bytes."""
     try:
-        front, back = download_image(req.front_url), download_image(req.back_url)
+        with stage("download"):
+            front_bytes, back_bytes = fetch_bytes(req.front_url), fetch_bytes(req.back_url)
+            digest = hashlib.sha256(front_bytes + b"\0" + back_bytes).hexdigest()
+            front, back = open_image(front_bytes, max_side), open_image(back_bytes, max_side)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Image download invalid: {e}")
+    return front, back, digest
+
+def download_pdf_card(req: AadhaarRequest, max_side: int = MAX_SIDE):
+    """Fetch an e-Aadhaar PDF; returns its text layer or the rendered card
+    regions, plus a digest of the PDF bytes."""
+    try:
+        with stage("download"):
+            data = fetch_pdf(req.pdf_url, timeout=deadline.timeout(10))
+        with stage("pdf", "pdfium"):
+            texts, images = read_pdf_card(data, max_side, req.pdf_password)
+    except PdfInputError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"PDF download invalid: {e}")
+    return texts, images, hashlib.sha256(data).hexdigest()
+
+def lookup_card(front: Image.Image, user_id: str):
+    """Answer a resubmission of the user's accepted card from its stored record.
+    Returns (fingerprint, reply or None)."""
+    if phash_index is None:
+        return None, None
+    with stage("phash"):
+        fingerprint = card_hash(front)
+        match = phash_index.lookup(fingerprint)
+    if not match:
+        return fingerprint, None
+    # A fingerprint match is a candidate; the number strip must agree
+    with stage("phash", "tesseract"):
+        confirmed = read_number(front) == match[0]
+    if confirmed:
+        record = load_record(match[0])
+        # Another user's record is never handed out
+        if record and record.get("User ID") == user_id:
+            CACHE_HITS.labels("phash").inc()
+            return fingerprint, {"status": "exists", "data": record, "match": {"type": "perceptual", "distance": match[1]}}
+    return fingerprint, None
+
+def read_card(front: Image.Image, back: Image.Image, mode: PipelineProfile = None):
+    mode = mode or modes.get()
+    deadline.check("orient")
+    # Rotated or skewed cards come out as garbage from every engine
+    if mode.orient:
+        with stage("orient"):
+            front, _ = normalize_orientation(front)
+            back, _ = normalize_orientation(back)
+    # Upscaling an image that is then downsized to max_side is wasted work
+    if mode.upscale and needs_upscale(front, mode.max_side):
+        front = upscale_within_budget(front, "front")
+    if mode.upscale and needs_upscale(back, mode.max_side):
+        back = upscale_within_budget(back, "back")
+    deadline.check("ocr")
+    try:
+        with stage("ocr", mode.engine):
+            if OCR_WORKERS:
+                front_txt, back_txt = ocr_in_pool(front, back, engine=mode.engine, max_side=mode.max_side,
+                                                  timeout=deadline.timeout())
+            else:
+                front_txt = ocr_image(front, mode.engine, mode.max_side, deadline.timeout())
+                deadline.check("ocr")
+                back_txt = ocr_image(back, mode.engine, mode.max_side, deadline.timeout())
+    except EngineUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Mode {mode.name!r} unavailable: {e}")
+    except TimeoutError:
+        deadline.exceeded("ocr")
+    if ocr_corpus is not None:
+        ocr_corpus.record(f"{mode.engine}@{mode.max_side}", front, back, front_txt, back_txt, mode.name)
+    # OCR text carries PII; only its size is logged
+    logging.debug(f"OCR text: front={len(front_txt)} chars, back={len(back_txt)} chars")
+    return front_txt, back_txt
+
+def needs_upscale(img: Image.Image, max_side: int) -> bool:
+    """Only when the whole UPSCALE_FACTOR output survives the resize to max_side."""
+    return UPSCALE_FACTOR * max(img.size) <= max_side
 
-    front, back = upscale_image(front, "front"), upscale_image(back, "back")
-    front_txt, back_txt = extract_text_from_image(front), extract_text_from_image(back)
-    full_txt = front_txt + "\n" + back_txt
-    logging.info("OCR text:\n" + full_txt)
+def upscale_within_budget(img: Image.Image, hint: str) -> Image.Image:
+    """Upscale unless too little of the request's budget is left for it."""
+    if deadline.remaining(float("inf")) < UPSCALE_MIN_BUDGET + OCR_RESERVE:
+        DEGRADED.labels("upscale").inc()
+        return img
+    with stage("upscale", "upscayl"):
+        return upscale_image(img, hint)
 
-    info = extract_info(front_txt, back_txt)
+def finish_card(req: AadhaarRequest, front_txt: str, back_txt: str, fingerprint):
+    with stage("extract", "regex"):
+        info = extract_info(front_txt, back_txt)
     if isinstance(info, JSONResponse):
         return info
 
     info.update({"User ID": req.user_id})
+    number = info.get("Aadhaar Number")
     # Remove all essential field checks, always return info
-    saved = save_data(info)
-    return {"status": "exists" if not saved else "saved", "data": info}
+    with stage("save"):
+        saved = save_data(info)
+    if saved:
+        if fingerprint is not None and number:
+            phash_index.add(fingerprint, number)
+        return {"status": "saved", "data": info}
+    return {"status": "exists", "data": info}
+
+def find_records(query: RecordsRequest) -> dict:
+    """Bulk lookup: pipelined Redis reads, or one pass over the pickle when Redis
+    is down. Keys Redis has nothing for are looked up in the pickle too."""
+    keys = {"aadhaar": query.aadhaar, "vid": query.vid, "user_id": query.user_id}
+    # Repeated params and comma-separated lists both work
+    keys = {kind: list(dict.fromkeys(k.strip() for v in values for k in v.split(",") if k.strip())) for kind, values in keys.items()}
+    total = sum(len(v) for v in keys.values())
+    if not total:
+        raise HTTPException(status_code=422, detail="Send at least one aadhaar, vid or user_id")
+    if total > RECORDS_MAX_KEYS:
+        raise HTTPException(status_code=413, detail=f"At most {RECORDS_MAX_KEYS} keys per call")
+    if r:
+        try:
+            with stage("records", "redis"):
+                results = lookup_redis(r, **keys)
+            set_redis_up(True)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"Redis lookup failed, scanning local store: {e}")
+            set_redis_up(False)
+        else:
+            # The Redis copy is best effort (a failed write is only logged);
+            # the files are the record of truth
+            missing = {kind: [k for k, found in results[kind].items() if not found] for kind in keys}
+            if not any(missing.values()):
+                return {"source": "redis", "results": results}
+            for kind, found in find_local_records(missing).items():
+                results[kind].update(found)
+            return {"source": "redis+local", "results": results}
+    return {"source": "local", "results": find_local_records(keys)}
+
+def find_local_records(keys: dict) -> dict:
+    with stage("records", "pkl"):
+        records = iter_pickle_records(pkl_path) if os.path.exists(pkl_path) else ()
+        return lookup_records(records, **keys)
+
+@app.get("/records")
+def get_records(aadhaar: List[str] = Query([]), vid: List[str] = Query([]), user_id: List[str] = Query([])):
+    return find_records(RecordsRequest(aadhaar=aadhaar, vid=vid, user_id=user_id))
+
+@app.post("/records")
+def post_records(query: RecordsRequest):
+    return find_records(query)
+
+@app.on_event("shutdown")
+def drain_persister():
+    persister.close()
+    mark_worker_dead()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome – Aadhar Extractor️"}
 
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
 @app.get("/health")
 async def health():
+    try:
+        redis_ok = bool(r and r.ping())
+    except redis.exceptions.RedisError:
+        redis_ok = False
+    if r:
+        set_redis_up(redis_ok)
     return {
-        "redis": bool(r and r.ping()),
+        "redis": redis_ok,
         "csv": os.path.exists(csv_path),
         "pkl": os.path.exists(pkl_path),
     }
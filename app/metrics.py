@@ -0,0 +1,116 @@
+# metrics.py
+# Prometheus instrumentation shared by main.py and app.py.
+#
+# With several uvicorn workers each process has its own registry, so a
+# scrape would see one random worker. Set PROMETHEUS_MULTIPROC_DIR to an
+# empty directory (cleared before every start) in the server's environment:
+# workers then write their samples there and /metrics aggregates all of them.
+import os
+import time
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from profiling import active_profile
+
+# === Metric Definitions ===
+# Buckets cover a fast regex extraction (~1ms) up to a slow upscale + OCR run (~2min)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+STAGE_LATENCY = Histogram(
+    "aadhaar_stage_seconds",
+    "Wall time spent in each pipeline stage",
+    ["stage", "engine"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_LATENCY = Histogram(
+    "aadhaar_request_seconds",
+    "End-to-end /upload_url wall time by pipeline mode",
+    ["mode"],
+    buckets=STAGE_BUCKETS,
+)
+CACHE_HITS = Counter("aadhaar_cache_hits_total", "Requests answered from a cache", ["cache"])
+DUPLICATES = Counter("aadhaar_duplicates_total", "Records rejected because they already exist")
+UPSCALE_FAILURES = Counter("aadhaar_upscale_failures_total", "Upscayl runs that failed and fell back")
+# Gauges say how workers combine: in-flight work is summed over live workers,
+# Redis is down if any live worker last saw it down
+REDIS_UP = Gauge("aadhaar_redis_up", "1 if the last Redis call succeeded, 0 otherwise", multiprocess_mode="livemin")
+REDIS_ERRORS = Counter("aadhaar_redis_errors_total", "Redis calls that raised")
+IN_FLIGHT = Gauge("aadhaar_requests_in_flight", "Requests currently being processed", ["endpoint"], multiprocess_mode="livesum")
+QUEUE_DEPTH = Gauge("aadhaar_queue_depth", "Requests waiting for an OCR slot", multiprocess_mode="livesum")
+COALESCED = Counter("aadhaar_coalesced_total", "Requests served by another in-flight request", ["scope"])
+DEADLINE_EXCEEDED = Counter("aadhaar_deadline_exceeded_total", "Requests cut off by their deadline or a client disconnect", ["stage"])
+DEGRADED = Counter("aadhaar_degraded_total", "Stages skipped to stay within the request deadline", ["stage"])
+PERSIST_QUEUE = Gauge("aadhaar_persist_queue_depth", "Records accepted but not yet written to disk", multiprocess_mode="livesum")
+SHED = Counter("aadhaar_shed_total", "Requests rejected by admission control", ["reason"])
+
+# Labelled children are looked up once and reused; .labels() is the slow part of observe()
+_children = {}
+
+
+class _StageTimer:
+    __slots__ = ("_hist", "_start")
+
+    def __init__(self, hist):
+        self._hist = hist
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _ProfiledStageTimer(_StageTimer):
+    # Only used while a profiled request is active, so the plain timer stays lean
+    __slots__ = ("_name", "_profile", "_cpu")
+
+    def __init__(self, hist, name, profile):
+        super().__init__(hist)
+        self._name = name
+        self._profile = profile
+
+    def __enter__(self):
+        self._cpu = time.thread_time()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._start
+        self._hist.observe(wall)
+        self._profile.record(self._name, wall, time.thread_time() - self._cpu)
+        return False
+
+
+def stage(name: str, engine: str = "none") -> _StageTimer:
+    """Time a pipeline stage: `with stage("ocr", "docling"): ...`"""
+    key = (name, engine)
+    hist = _children.get(key)
+    if hist is None:
+        hist = _children[key] = STAGE_LATENCY.labels(name, engine)
+    profile = active_profile.get()
+    if profile is not None:
+        return _ProfiledStageTimer(hist, name, profile)
+    return _StageTimer(hist)
+
+
+def set_redis_up(up: bool):
+    REDIS_UP.set(1 if up else 0)
+    if not up:
+        REDIS_ERRORS.inc()
+
+
+def metrics_response() -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Every worker's samples, whichever worker answers the scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_worker_dead():
+    """Shutdown hook: drop this worker's live gauges from the aggregate."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,75 @@
+# modes.py
+# Named speed/accuracy profiles for the /upload_url pipeline.
+import os
+import json
+import logging
+from collections import namedtuple
+
+ENGINES = ("docling", "tesseract")
+
+# upscale: run Real-ESRGAN 2x on sides smaller than max_side
+# max_side: longest side decoded and handed to the OCR engine
+# orient:   estimate rotation/skew (and ask Tesseract OSD about 180°) first
+PipelineProfile = namedtuple("PipelineProfile", ["name", "upscale", "max_side", "engine", "orient"])
+
+DEFAULT_PROFILES = {
+    "fast": {"upscale": False, "max_side": 1000, "engine": "tesseract", "orient": False},
+    "balanced": {"upscale": False, "max_side": 1200, "engine": "docling", "orient": True},
+    # What every request ran before modes existed
+    "accurate": {"upscale": True, "max_side": 1200, "engine": "docling", "orient": True},
+}
+
+
+class EngineUnavailable(RuntimeError):
+    """The profile's OCR engine is not installed on this host. A plain
+    exception so it survives the trip back from a pool worker."""
+
+
+class PipelineProfiles:
+    """Profiles by name. PIPELINE_PROFILES may point to a JSON file (or hold
+    inline JSON) of {"name": {field: value}}; entries override the defaults
+    field by field, and new names can be added, e.g. per customer."""
+
+    def __init__(self, profiles: dict, default: str = "accurate"):
+        self.profiles = {}
+        for name, fields in profiles.items():
+            self.profiles[name] = self._build(name, fields)
+        if default not in self.profiles:
+            raise ValueError(f"Default pipeline mode {default!r} is not defined")
+        self.default = default
+
+    @staticmethod
+    def _build(name: str, fields: dict) -> PipelineProfile:
+        unknown = set(fields) - set(PipelineProfile._fields[1:])
+        if unknown:
+            raise ValueError(f"Pipeline mode {name!r}: unknown fields {sorted(unknown)}")
+        base = DEFAULT_PROFILES.get(name, DEFAULT_PROFILES["accurate"])
+        merged = {**base, **fields}
+        if merged["engine"] not in ENGINES:
+            raise ValueError(f"Pipeline mode {name!r}: engine must be one of {ENGINES}")
+        if int(merged["max_side"]) < 64:
+            raise ValueError(f"Pipeline mode {name!r}: max_side too small")
+        return PipelineProfile(name, bool(merged["upscale"]), int(merged["max_side"]), merged["engine"], bool(merged["orient"]))
+
+    @classmethod
+    def from_env(cls) -> "PipelineProfiles":
+        profiles = {name: dict(fields) for name, fields in DEFAULT_PROFILES.items()}
+        source = os.getenv("PIPELINE_PROFILES", "").strip()
+        if source:
+            if source.startswith("{"):
+                overrides = json.loads(source)
+            else:
+                with open(source, encoding="utf-8") as f:
+                    overrides = json.load(f)
+            for name, fields in overrides.items():
+                profiles[name] = {**profiles.get(name, {}), **fields}
+            logging.info(f"Pipeline modes: {', '.join(sorted(profiles))}")
+        return cls(profiles, default=os.getenv("PIPELINE_MODE", "accurate"))
+
+    def get(self, name: str = None) -> PipelineProfile:
+        """Profile for a request's mode; None selects the default. Raises
+        KeyError for names that are not configured."""
+        return self.profiles[name or self.default]
+
+    def names(self):
+        return sorted(self.profiles)
@@ -0,0 +1,99 @@
+# ocr_corpus.py
+# Record raw OCR output so extractors can be re-run without OCR (replay.py).
+#
+# One SQLite file: OCR text is zlib-compressed and stored once per
+# (image, engine, side); each recorded request adds a card row pointing at
+# its front and back texts. Enable in the API with OCR_RECORD_DIR.
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_text (
+    image_hash TEXT NOT NULL,
+    engine     TEXT NOT NULL,
+    side       TEXT NOT NULL,
+    text       BLOB NOT NULL,
+    PRIMARY KEY (image_hash, engine, side)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cards (
+    card_id    TEXT NOT NULL,
+    engine     TEXT NOT NULL,
+    front_hash TEXT NOT NULL,
+    back_hash  TEXT NOT NULL,
+    mode       TEXT,
+    recorded   REAL NOT NULL,
+    PRIMARY KEY (card_id, engine)
+);
+CREATE INDEX IF NOT EXISTS cards_engine ON cards (engine, recorded);
+"""
+
+
+def image_hash(img) -> str:
+    """Digest of the pixels handed to OCR (after orientation and upscaling)."""
+    h = hashlib.sha256(f"{img.mode}:{img.size}".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+class OcrCorpus:
+    def __init__(self, path: str):
+        self.path = path
+        # Written from the OCR threadpool; one connection behind a lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """The corpus in OCR_RECORD_DIR, or None when recording is off."""
+        out_dir = os.getenv("OCR_RECORD_DIR")
+        if not out_dir:
+            return None
+        os.makedirs(out_dir, exist_ok=True)
+        return cls(os.path.join(out_dir, "ocr_corpus.sqlite"))
+
+    def record(self, engine: str, front, back, front_text: str, back_text: str, mode: str = None):
+        """Store one card's OCR output. Never raises: recording must not fail a request."""
+        try:
+            front_hash, back_hash = image_hash(front), image_hash(back)
+            card_id = hashlib.sha256(f"{front_hash}:{back_hash}".encode()).hexdigest()
+            rows = [
+                (front_hash, engine, "front", zlib.compress(front_text.encode("utf-8"), 9)),
+                (back_hash, engine, "back", zlib.compress(back_text.encode("utf-8"), 9)),
+            ]
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO ocr_text VALUES (?, ?, ?, ?)", rows)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?)",
+                    (card_id, engine, front_hash, back_hash, mode, time.time()),
+                )
+        except Exception as e:
+            logging.warning(f"OCR recording failed: {e}")
+
+    def cards(self, engine: str = None, limit: int = None):
+        """Yield (card_id, engine, front_text, back_text), oldest first."""
+        query = (
+            "SELECT c.card_id, c.engine, f.text, b.text FROM cards c"
+            " JOIN ocr_text f ON f.image_hash = c.front_hash AND f.engine = c.engine AND f.side = 'front'"
+            " JOIN ocr_text b ON b.image_hash = c.back_hash AND b.engine = c.engine AND b.side = 'back'"
+        )
+        params = []
+        if engine:
+            # "docling" matches every size it was recorded at ("docling@1200")
+            query += " WHERE c.engine = ? OR c.engine LIKE ?"
+            params += [engine, f"{engine}@%"]
+        query += " ORDER BY c.recorded"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        for card_id, eng, front, back in self._db.execute(query, params):
+            yield card_id, eng, zlib.decompress(front).decode("utf-8"), zlib.decompress(back).decode("utf-8")
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,89 @@
+# ocr_engines.py
+# docling and Tesseract text extraction. Also what OCR pool workers import:
+# nothing here touches Redis, the record store or the phash index.
+import io
+import os
+
+from PIL import Image
+import pytesseract
+from docling_core.types.io import DocumentStream
+
+from card_converter import build_card_converter, card_lines, lines_text
+from modes import EngineUnavailable
+from shm_transport import attached_images
+
+# Longest side handed to OCR; known up front so decoding can aim for it
+MAX_SIDE = 1200
+# Hindi is opt-in (TESSERACT_LANG=eng+hin): hosts often lack hin.traineddata
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+
+_converter = None
+_num_threads = None
+
+
+def configure(num_threads: int):
+    """docling CPU threads; also the pool initializer, so workers split the CPU the same way."""
+    global _num_threads
+    _num_threads = num_threads
+
+
+def get_converter():
+    # Built on first use: the layout and OCR models take seconds to load
+    global _converter
+    if _converter is None:
+        _converter = build_card_converter(_num_threads)
+    return _converter
+
+
+def extract_text_from_image(img: Image.Image, max_side: int = MAX_SIDE) -> str:
+    return lines_text(extract_lines_from_image(img, max_side))
+
+
+def extract_lines_from_image(img: Image.Image, max_side: int = MAX_SIDE) -> list:
+    """OCR lines (text + pixel bbox in the resized image), top to bottom."""
+    # Resize image to max_side on the longest side before OCR. JPEGs were
+    # already draft-decoded to under 2x this size, so bicubic is enough.
+    w, h = img.size
+    if max(w, h) > max_side:
+        scale = max_side / float(max(w, h))
+        new_size = (int(w * scale), int(h * scale))
+        img = img.resize(new_size, Image.BICUBIC)
+    # save PIL as bytes for docling: it accepts path or stream
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    buf.seek(0)
+    doc_stream = DocumentStream(name="input.png", stream=buf)
+    result = get_converter().convert(doc_stream)
+    return card_lines(result, img.size)
+
+
+def tesseract_text(img: Image.Image, max_side: int = MAX_SIDE, timeout: float = None) -> str:
+    # Tesseract wants upright, modest-sized input; no layout model involved
+    if max(img.size) > max_side:
+        img = img.copy()
+        img.thumbnail((max_side, max_side), Image.BICUBIC)
+    try:
+        return pytesseract.image_to_string(img, lang=TESSERACT_LANG, timeout=timeout or 0)
+    except pytesseract.TesseractNotFoundError:
+        raise EngineUnavailable("Tesseract engine not installed")
+    except pytesseract.TesseractError as e:
+        if "language" in str(e.message).lower():
+            raise EngineUnavailable(f"Tesseract language data for {TESSERACT_LANG!r} not installed")
+        raise
+    except RuntimeError as e:
+        if "timeout" in str(e).lower():
+            raise TimeoutError("Tesseract timed out")  # killed by pytesseract
+        raise
+
+
+def ocr_image(img: Image.Image, engine: str, max_side: int, timeout: float = None) -> str:
+    if engine == "tesseract":
+        return tesseract_text(img, max_side, timeout)
+    # docling cannot be interrupted; the deadline is checked before each side
+    return extract_text_from_image(img, max_side)
+
+
+def ocr_shared(handles, engine: str = "docling", max_side: int = MAX_SIDE, timeout: float = None) -> tuple:
+    """Process-pool entry point: OCR images passed as shared memory handles."""
+    with attached_images(handles) as images:
+        return tuple(ocr_image(img, engine, max_side, timeout) for img in images)
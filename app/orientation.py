@@ -0,0 +1,115 @@
+# orientation.py
+# Cheap rotation/skew estimate so each card is OCR'd once, upright.
+import logging
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+try:
+    import pytesseract
+except ImportError:  # OSD is optional; without it unclear up/down calls stand
+    pytesseract = None
+
+WORK_SIDE = 400  # projection profiles run on a thumbnail this size
+UPRIGHT_SIDE = 800  # ascenders need a few rows of their own to be told apart
+OSD_SIDE = 1200  # Tesseract OSD needs legible glyphs
+OSD_MIN_CONF = 2.0
+# Below this ascender/descender imbalance the up/down call goes to OSD
+# (dataset cards, upright or skewed 4°, score 0.06-0.9, median 0.25)
+UPRIGHT_MIN_MARGIN = 0.05
+LINE_MIN_INK = 0.02  # row ink fraction that counts as part of a text line
+
+_osd_available = pytesseract is not None
+
+
+def _ink_mask(img: Image.Image, side: int = WORK_SIDE) -> Image.Image:
+    """Thumbnail with text strokes = 255. Pixels are ink when darker than
+    their neighbourhood, so large dark areas (photo, background cloth) drop out."""
+    g = img.convert("L")
+    g.thumbnail((side, side), Image.BILINEAR)
+    a = np.asarray(g, dtype=np.int16)
+    local = np.asarray(g.filter(ImageFilter.BoxBlur(8 * side // WORK_SIDE)), dtype=np.int16)
+    return Image.fromarray(((a < local - 12) * 255).astype(np.uint8))
+
+
+def _profile_score(mask: Image.Image, angle: float) -> float:
+    # Text lines aligned with the rows give a spiky row profile; the sum of
+    # squared differences between neighbouring rows peaks at that angle
+    rows = np.asarray(mask.rotate(angle, Image.NEAREST, expand=True), dtype=np.float32).sum(axis=1)
+    return float(np.square(np.diff(rows)).sum())
+
+
+def _upright_score(mask: Image.Image, angle: float) -> float:
+    """In [-1, 1]; positive when the text reads upright after rotating by angle.
+    Caps, digits and ascenders put ink above each line's x-height core far
+    more often than descenders put it below, so a flipped line shows the
+    imbalance the other way round."""
+    turned = mask.rotate(angle, Image.NEAREST, expand=True)
+    rows = np.asarray(turned, dtype=np.float32).sum(axis=1)
+    on = np.concatenate([[False], rows > LINE_MIN_INK * 255 * turned.width, [False]])
+    edges = np.flatnonzero(np.diff(on.astype(np.int8)))
+    above = below = 0.0
+    for top, bottom in zip(edges[::2], edges[1::2]):
+        line = rows[top:bottom]
+        if len(line) < 4:
+            continue
+        core = np.flatnonzero(line >= 0.5 * line.max())
+        above += line[:core[0]].sum()
+        below += line[core[-1] + 1:].sum()
+    return float((above - below) / max(above + below, 1.0))
+
+
+def _upside_down(img: Image.Image) -> bool:
+    """Tesseract's OSD, for cards whose line profiles do not say which way is up."""
+    global _osd_available
+    if not _osd_available:
+        return False
+    small = img.convert("L")
+    small.thumbnail((OSD_SIDE, OSD_SIDE), Image.BILINEAR)
+    try:
+        osd = pytesseract.image_to_osd(small, output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractNotFoundError:
+        logging.warning("Tesseract not installed; unclear up/down calls will not be checked")
+        _osd_available = False
+        return False
+    except pytesseract.TesseractError:
+        return False  # too little text for OSD
+    return osd.get("rotate") == 180 and osd.get("orientation_conf", 0) >= OSD_MIN_CONF
+
+
+def estimate_rotation(img: Image.Image, max_skew: float = 10, step: float = 1.0):
+    """Counter-clockwise angle (degrees, 0-360) that brings the text upright,
+    and whether the up/down call was clear-cut."""
+    mask = _ink_mask(img)
+    candidates = [base + d for base in (0, 90) for d in np.arange(-max_skew, max_skew + step, step)]
+    best = max(candidates, key=lambda a: _profile_score(mask, a))
+    # Refine around the coarse peak
+    fine = np.arange(best - step, best + step + 0.25, 0.25)
+    angle = float(max(fine, key=lambda a: _profile_score(mask, a)))
+    # Profiles only find the line direction: 90° and 270° (or 0° and 180°)
+    # look the same to them
+    score = _upright_score(_ink_mask(img, UPRIGHT_SIDE), angle)
+    if score < 0:
+        angle += 180
+    return angle % 360, abs(score) >= UPRIGHT_MIN_MARGIN
+
+
+def _rotate(img: Image.Image, angle: float, min_skew: float) -> Image.Image:
+    quarter = int(round(angle / 90)) % 4
+    skew = angle - round(angle / 90) * 90
+    if quarter:
+        # Lossless and cheap for whole quarter turns
+        img = img.transpose((None, Image.ROTATE_90, Image.ROTATE_180, Image.ROTATE_270)[quarter])
+    if abs(skew) >= min_skew:
+        img = img.convert("RGB").rotate(skew, Image.BICUBIC, expand=True, fillcolor=(255, 255, 255))
+    return img
+
+
+def normalize_orientation(img: Image.Image, min_skew: float = 0.5):
+    """Return the image rotated upright and the angle that was applied."""
+    angle, confident = estimate_rotation(img)
+    img = _rotate(img, angle, min_skew)
+    if not confident and _upside_down(img):
+        img = img.transpose(Image.ROTATE_180)
+        angle += 180
+    return img, angle % 360
@@ -0,0 +1,137 @@
+# pdf_input.py
+# e-Aadhaar PDFs: read the text layer when there is one, otherwise render
+# only the card regions at the resolution OCR needs.
+import os
+import re
+import json
+import logging
+import threading
+
+import requests
+import pypdfium2 as pdfium
+
+# Card regions as page fractions (left, top, right, bottom), top-left origin.
+# The UIDAI e-Aadhaar prints the cut-out card along the bottom of the first
+# page, front on the left and back on the right. PDF_CARD_REGIONS overrides
+# this with the same JSON shape.
+DEFAULT_REGIONS = {
+    "front": (0.04, 0.62, 0.50, 0.95),
+    "back": (0.50, 0.62, 0.96, 0.95),
+}
+AADHAAR_NUMBER = re.compile(r"\b\d{4} ?\d{4} ?\d{4}\b")
+# "Masked Aadhaar" downloads print only the last four digits, in the text
+# layer and the artwork alike, so OCR cannot recover the number either
+MASKED_NUMBER = re.compile(r"\b[Xx]{4} ?[Xx]{4} ?\d{4}\b")
+CHUNK = 64 * 1024
+
+# pdfium is not thread-safe and requests share the threadpool
+_pdfium_lock = threading.Lock()
+
+
+class PdfInputError(ValueError):
+    """The PDF could not be fetched or opened; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def card_regions() -> dict:
+    source = os.getenv("PDF_CARD_REGIONS", "").strip()
+    regions = json.loads(source) if source else DEFAULT_REGIONS
+    return {side: tuple(float(v) for v in regions[side]) for side in ("front", "back")}
+
+
+def fetch_pdf(url: str, max_bytes: int = None, timeout: float = 10) -> bytes:
+    """Stream the download, refusing anything over PDF_MAX_BYTES (default
+    10MB) before it is read in full."""
+    if max_bytes is None:
+        max_bytes = int(os.getenv("PDF_MAX_BYTES", str(10 * 1024 * 1024)))
+    with requests.get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        if int(resp.headers.get("Content-Length") or 0) > max_bytes:
+            raise PdfInputError(f"PDF larger than {max_bytes} bytes", status=413)
+        chunks, size = [], 0
+        for chunk in resp.iter_content(CHUNK):
+            size += len(chunk)
+            if size > max_bytes:
+                raise PdfInputError(f"PDF larger than {max_bytes} bytes", status=413)
+            chunks.append(chunk)
+    data = b"".join(chunks)
+    if not data.startswith(b"%PDF"):
+        raise PdfInputError("Not a PDF")
+    return data
+
+
+def _open(data: bytes, password: str = None):
+    try:
+        return pdfium.PdfDocument(data, password=password)
+    except pdfium.PdfiumError as e:
+        if "password" in str(e).lower():
+            raise PdfInputError("PDF is password protected; send pdf_password" if not password else "Wrong pdf_password")
+        raise PdfInputError(f"Unreadable PDF: {e}")
+
+
+def _region_box(page, region):
+    """Region fractions -> PDF points (left, bottom, right, top), bottom-left origin."""
+    width, height = page.get_size()
+    left, top, right, bottom = region
+    return left * width, (1 - bottom) * height, right * width, (1 - top) * height
+
+
+def text_layer(data: bytes, password: str = None, regions: dict = None):
+    """(front_text, back_text) from the first page's embedded text, or None
+    when the text layer does not carry an Aadhaar number (scanned or
+    image-only PDFs). A masked e-Aadhaar is refused with a 422."""
+    regions = regions or card_regions()
+    with _pdfium_lock:
+        doc = _open(data, password)
+        try:
+            page = doc[0]
+            textpage = page.get_textpage()
+            sides = tuple(textpage.get_text_bounded(*_region_box(page, regions[side])) for side in ("front", "back"))
+            full = None
+            if not AADHAAR_NUMBER.search("\n".join(sides)):
+                # Regions off for this layout: the whole page is still better than OCR
+                full = textpage.get_text_range()
+        finally:
+            doc.close()
+    if full is None:
+        return tuple(s.replace("\r\n", "\n") for s in sides)
+    if AADHAAR_NUMBER.search(full):
+        full = full.replace("\r\n", "\n")
+        return full, full
+    if MASKED_NUMBER.search(full):
+        raise PdfInputError("Masked Aadhaar PDF: download the e-Aadhaar with the full number", status=422)
+    return None
+
+
+def render_regions(data: bytes, max_side: int, password: str = None, regions: dict = None):
+    """Rasterize only the front and back card regions of the first page,
+    each at the scale that makes its longest side max_side pixels."""
+    regions = regions or card_regions()
+    images = []
+    with _pdfium_lock:
+        doc = _open(data, password)
+        try:
+            page = doc[0]
+            width, height = page.get_size()
+            for side in ("front", "back"):
+                left, bottom, right, top = _region_box(page, regions[side])
+                scale = max_side / max(right - left, top - bottom)
+                # crop is what to cut off each edge, in points, before rendering
+                bitmap = page.render(scale=scale, crop=(left, bottom, width - right, height - top))
+                images.append(bitmap.to_pil().convert("RGB"))  # own copy, independent of pdfium
+        finally:
+            doc.close()
+    logging.debug(f"Rendered PDF card regions at {[img.size for img in images]}")
+    return tuple(images)
+
+
+def read_pdf_card(data: bytes, max_side: int, password: str = None):
+    """(texts, None) when the text layer has the card, else (None, images)
+    with the front and back regions rendered for OCR."""
+    texts = text_layer(data, password)
+    if texts:
+        return texts, None
+    return None, render_regions(data, max_side, password)
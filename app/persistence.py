@@ -0,0 +1,237 @@
+# persistence.py
+# Write-behind persistence of accepted records with group commit.
+#
+# The request path only claims the Aadhaar number (so duplicates are still
+# rejected synchronously) and enqueues the record. One writer thread drains
+# the queue in batches: a single pickle frame and a single CSV write per
+# batch, one fsync per file, and one pipelined round trip to Redis.
+#
+# Durability (PERSIST_MODE):
+#   group  (default) the request waits until the batch holding its record is
+#          written and fsynced. A "saved" response survives a process or OS
+#          crash. Latency is one batch flush, shared by everyone in the batch.
+#   async  the request returns once the record is queued. A crash loses
+#          whatever is still queued (at most PERSIST_QUEUE_SIZE records);
+#          their Redis claims expire after PERSIST_CLAIM_TTL so those cards
+#          can be submitted again.
+# In both modes the Redis HSET is best effort: the files are the record of
+# truth, and a failed Redis write is logged and counted, not retried.
+# On shutdown the queue is drained before the process exits.
+import os
+import io
+import csv
+import time
+import queue
+import pickle
+import logging
+import threading
+from concurrent.futures import Future
+
+from metrics import stage, set_redis_up, DUPLICATES, PERSIST_QUEUE
+from records import iter_pickle_records, index_record
+
+# Claim only if neither the record nor another worker's claim exists
+_CLAIM = (
+    "if redis.call('exists', KEYS[1]) == 1 then return 0 end "
+    "if redis.call('set', KEYS[2], ARGV[1], 'NX', 'EX', ARGV[2]) then return 1 end return 0"
+)
+
+_STOP = object()
+
+
+class Persister:
+    def __init__(self, pkl_path: str, csv_path: str, redis_client=None, mode: str = "group",
+                 batch_size: int = 64, max_wait: float = 0.005, queue_size: int = 10000,
+                 claim_ttl: int = 86400, fsync: bool = True):
+        if mode not in ("group", "async"):
+            raise ValueError(f"PERSIST_MODE must be 'group' or 'async', not {mode!r}")
+        self.pkl_path = pkl_path
+        self.csv_path = csv_path
+        self.redis = redis_client
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.claim_ttl = claim_ttl
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        # Numbers already stored or claimed by this process
+        self._known = set()
+        self._csv_header = None
+        if os.path.exists(pkl_path):
+            self._known.update(entry.get("Aadhaar Number") for entry in iter_pickle_records(pkl_path))
+        self._writer = threading.Thread(target=self._run, name="persister", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls, pkl_path: str, csv_path: str, redis_client=None) -> "Persister":
+        return cls(
+            pkl_path,
+            csv_path,
+            redis_client,
+            mode=os.getenv("PERSIST_MODE", "group"),
+            batch_size=int(os.getenv("PERSIST_BATCH_SIZE", "64")),
+            max_wait=float(os.getenv("PERSIST_MAX_WAIT_MS", "5")) / 1000,
+            queue_size=int(os.getenv("PERSIST_QUEUE_SIZE", "10000")),
+            claim_ttl=int(os.getenv("PERSIST_CLAIM_TTL", "86400")),
+            fsync=os.getenv("PERSIST_FSYNC", "1") == "1",
+        )
+
+    # === Request path ===
+    def save(self, info: dict) -> bool:
+        """Claim and enqueue a record. False if the Aadhaar number already
+        exists (or, in group mode, if the write failed)."""
+        number = info["Aadhaar Number"]
+        # UTC, ISO 8601: what records.py --since/--until compare against
+        info.setdefault("timestamp", time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()))
+        if not self.claim(number):
+            logging.info(f"⚠️ Aadhaar {number} already exists.")
+            DUPLICATES.inc()
+            return False
+        if self._closed:
+            self.release(number)
+            raise RuntimeError("Persister is shut down")
+        done = Future()
+        self._queue.put((dict(info), done))  # blocks when the writer is PERSIST_QUEUE_SIZE behind
+        PERSIST_QUEUE.inc()
+        if self.mode == "async":
+            return True
+        try:
+            done.result()
+        except Exception as e:
+            logging.error(f"❌ Error while saving data: {e}")
+            return False
+        return True
+
+    def claim(self, number) -> bool:
+        with self._lock:
+            if number in self._known:
+                return False
+            self._known.add(number)
+        if self.redis is None:
+            return True
+        try:
+            claimed = self.redis.eval(_CLAIM, 2, f"aadhaar:{number}", f"aadhaar:claim:{number}", os.getpid(), self.claim_ttl)
+        except Exception as e:
+            # Local claim still stops duplicates within this worker
+            logging.warning(f"Redis claim failed, using local claim only: {e}")
+            set_redis_up(False)
+            return True
+        set_redis_up(True)
+        return bool(claimed)
+
+    def release(self, number):
+        with self._lock:
+            self._known.discard(number)
+        if self.redis is not None:
+            try:
+                self.redis.delete(f"aadhaar:claim:{number}")
+            except Exception:
+                pass  # expires on its own
+
+    # === Writer ===
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            # Whatever queued up during the previous flush is taken at once;
+            # after that, wait up to max_wait for stragglers
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            items = [item for item in batch if item is not _STOP]
+            if items:
+                PERSIST_QUEUE.dec(len(items))
+                self._flush(items)
+            if stop:
+                # Records that raced with close() are still written
+                late = []
+                while True:
+                    try:
+                        late.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if late:
+                    PERSIST_QUEUE.dec(len(late))
+                    self._flush(late)
+                return
+
+    def _flush(self, items):
+        records = [info for info, _ in items]
+        try:
+            with stage("persist", self.mode):
+                self._write_files(records)
+        except Exception as e:
+            logging.error(f"❌ Persisting {len(records)} records failed: {e}")
+            for info, done in items:
+                self.release(info["Aadhaar Number"])
+                done.set_exception(e)
+            return
+        for _, done in items:
+            done.set_result(True)
+        self._write_redis(records)
+
+    def _write_files(self, records):
+        # One write() per file: O_APPEND keeps batches from several worker
+        # processes from interleaving
+        frame = pickle.dumps(records)
+        rows = io.StringIO()
+        fields = self._csv_fields(records[0])
+        writer = csv.DictWriter(rows, fieldnames=fields, extrasaction="ignore")
+        if not os.path.exists(self.csv_path):
+            writer.writeheader()
+        writer.writerows(records)
+        # records.iter_pickle_records reads the appended frames
+        with open(self.pkl_path, "ab") as f:
+            f.write(frame)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
+            f.write(rows.getvalue())
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _csv_fields(self, first: dict) -> list:
+        """Columns of the existing CSV header, so rows stay aligned with files
+        started before a field (e.g. timestamp) was added; else first's keys."""
+        if self._csv_header is None and os.path.exists(self.csv_path):
+            with open(self.csv_path, newline="", encoding="utf-8") as f:
+                self._csv_header = next(csv.reader(f), None)
+        return self._csv_header or list(first.keys())
+
+    def _write_redis(self, records):
+        if self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for info in records:
+                pipe.hset(f"aadhaar:{info['Aadhaar Number']}", mapping={k: v for k, v in info.items() if v is not None})
+                index_record(pipe, info)  # VID / user ID -> number, for /records
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Redis write of {len(records)} records failed: {e}")
+            set_redis_up(False)
+            return
+        set_redis_up(True)
+        logging.info(f"✅ {len(records)} records saved to Redis")
+
+    def close(self, timeout: float = 30):
+        """Stop accepting records and wait for the queue to drain."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logging.error(f"Persister did not drain within {timeout}s; {self._queue.qsize()} records unsaved")
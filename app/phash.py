@@ -0,0 +1,166 @@
+# phash.py
+# Perceptual fingerprints of accepted cards, used to skip OCR on resubmissions.
+#
+# Every card shares the same template, so a whole-card hash cannot tell two
+# cards apart. The fingerprint covers only the front's photo and number
+# regions. On the dataset cards (100 cards x 5 augmentations), copies of one
+# card are at most 22 of 318 bits apart and different cards at least 30. A
+# match is still only a candidate until read_number() finds the same number
+# on the submitted card.
+import os
+import re
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+
+try:
+    import pytesseract
+except ImportError:  # without it matches cannot be confirmed; see number_reader_available
+    pytesseract = None
+
+# Card regions as front-side fractions (left, top, right, bottom) and the
+# size each is reduced to before its DCT; the low-frequency block kept per
+# region (minus the DC term) becomes the hash bits
+REGIONS = (
+    ((0.03, 0.33, 0.25, 0.72), (32, 32), (8, 8)),     # photo
+    ((0.28, 0.75, 0.70, 0.84), (128, 32), (8, 32)),   # Aadhaar number
+)
+HASH_BITS = sum(rows * cols - 1 for _, _, (rows, cols) in REGIONS)
+HEX_WIDTH = (HASH_BITS + 3) // 4
+NUMBER_REGION = REGIONS[1][0]
+# Multi-index hashing: the hash is split into CHUNKS substrings, each with
+# its own exact-match table. Two hashes within distance d < CHUNKS must agree
+# exactly on at least one chunk (pigeonhole), so probing CHUNKS buckets finds
+# every near-duplicate without a full scan.
+CHUNKS = 16
+CHUNK_BITS = -(-HASH_BITS // CHUNKS)
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+_dct_matrices = {}
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so dct(x) = M @ x."""
+    m = _dct_matrices.get(n)
+    if m is None:
+        k, i = np.arange(n)[:, None], np.arange(n)[None, :]
+        m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        m[0] /= np.sqrt(2.0)
+        m = _dct_matrices[n] = m.astype(np.float32)
+    return m
+
+
+def _crop(img: Image.Image, region) -> Image.Image:
+    w, h = img.size
+    left, top, right, bottom = region
+    return img.crop((int(left * w), int(top * h), int(right * w), int(bottom * h)))
+
+
+def card_hash(front: Image.Image) -> int:
+    """HASH_BITS-bit pHash of the front's photo and number regions."""
+    parts = []
+    for region, size, (rows, cols) in REGIONS:
+        g = np.asarray(_crop(front, region).convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+        coeffs = (_dct_matrix(size[1]) @ g @ _dct_matrix(size[0]).T)[:rows, :cols].ravel()[1:]
+        parts.append(coeffs > np.median(coeffs))
+    bits = np.concatenate(parts)
+    # Interleave so each index chunk samples every region and frequency:
+    # neighbouring coefficients of same-template cards agree often, and
+    # chunks of them would pile every card into a few buckets
+    bits = np.concatenate([bits[i::CHUNKS] for i in range(CHUNKS)])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def number_reader_available() -> bool:
+    if pytesseract is None:
+        return False
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        return False
+    return True
+
+
+def read_number(front: Image.Image):
+    """Digits Tesseract reads in the number region alone: one text line,
+    a fraction of a full OCR pass. None when it cannot be read."""
+    strip = _crop(front, NUMBER_REGION).convert("L")
+    try:
+        text = pytesseract.image_to_string(strip, config="--psm 7 -c tessedit_char_whitelist=0123456789")
+    except (RuntimeError, OSError) as e:
+        logging.warning(f"Number check failed: {e}")
+        return None
+    return re.sub(r"\D", "", text) or None
+
+
+class PerceptualIndex:
+    def __init__(self, path: str, max_distance: int = 12, redis_client=None, redis_key: str = "aadhaar:phash:regions"):
+        if max_distance >= CHUNKS:
+            logging.warning(f"PHASH_MAX_DISTANCE={max_distance} exceeds what the index can guarantee; using {CHUNKS - 1}")
+            max_distance = CHUNKS - 1
+        self.path = path
+        self.max_distance = max_distance
+        self.redis = redis_client
+        self.redis_key = redis_key
+        self._tables = [{} for _ in range(CHUNKS)]
+        self._values = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._values)
+
+    def lookup(self, h: int):
+        """Return (aadhaar_number, distance) of the closest stored card, or None."""
+        best = None
+        seen = set()
+        for i, table in enumerate(self._tables):
+            for cand in table.get((h >> (i * CHUNK_BITS)) & CHUNK_MASK, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                dist = (cand ^ h).bit_count()
+                if dist <= self.max_distance and (best is None or dist < best[1]):
+                    best = (self._values[cand], dist)
+        return best
+
+    def add(self, h: int, aadhaar_number: str):
+        with self._lock:
+            if h in self._values:
+                return
+            self._insert(h, aadhaar_number)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{h:0{HEX_WIDTH}x} {aadhaar_number}\n")
+        if self.redis:
+            try:
+                self.redis.hset(self.redis_key, f"{h:0{HEX_WIDTH}x}", aadhaar_number)
+            except Exception as e:
+                logging.warning(f"Could not mirror phash to Redis: {e}")
+
+    def _insert(self, h: int, aadhaar_number: str):
+        self._values[h] = aadhaar_number
+        for i, table in enumerate(self._tables):
+            table.setdefault((h >> (i * CHUNK_BITS)) & CHUNK_MASK, []).append(h)
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    # Entries of the old whole-card hash have another width
+                    if len(parts) == 2 and len(parts[0]) == HEX_WIDTH:
+                        self._insert(int(parts[0], 16), parts[1])
+        if self.redis:
+            # Other workers may have accepted cards this one has not seen
+            try:
+                for key, number in self.redis.hscan_iter(self.redis_key, count=10000):
+                    if len(key) != HEX_WIDTH:
+                        continue
+                    h = int(key, 16)
+                    if h not in self._values:
+                        self._insert(h, number)
+            except Exception as e:
+                logging.warning(f"Could not load phash index from Redis: {e}")
+        logging.info(f"Perceptual index loaded with {len(self._values)} cards")
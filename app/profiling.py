@@ -0,0 +1,111 @@
+# profiling.py
+# Opt-in per-request profiling for the /upload_url pipeline.
+import os
+import time
+import uuid
+import cProfile
+import logging
+import contextvars
+
+# Set while a profiled request is running; metrics.stage() reports into it
+active_profile = contextvars.ContextVar("active_profile", default=None)
+
+
+class RequestProfile:
+    """Deterministic profile of a single request plus per-stage wall/CPU timings.
+
+    The blocking pipeline steps run in the threadpool via call_profiled(); only
+    those calls are profiled, so other requests sharing the event loop do not
+    leak into this profile."""
+
+    def __init__(self, out_dir: str, max_files: int):
+        self.out_dir = out_dir
+        self.max_files = max_files
+        self.stages = {}
+        self.path = None
+        self._cpu = 0.0
+        self._profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self._token = active_profile.set(self)
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total = {
+            "wall": time.perf_counter() - self._wall,
+            "cpu": self._cpu,
+        }
+        active_profile.reset(self._token)
+        try:
+            self._dump()
+        except OSError as e:
+            logging.warning(f"Could not write profile: {e}")
+        return False
+
+    def call(self, fn, *args):
+        # Steps of one request run one after another, so the profiler is
+        # never enabled in two threads at once
+        cpu = time.thread_time()
+        self._profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            self._profiler.disable()
+            self._cpu += time.thread_time() - cpu
+
+    def record(self, name: str, wall: float, cpu: float):
+        # Stages run once per side (front/back), so timings accumulate
+        entry = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+
+    def summary(self) -> dict:
+        return {
+            "stages": {k: {t: round(v, 4) for t, v in d.items()} for k, d in self.stages.items()},
+            "total": {t: round(v, 4) for t, v in self.total.items()},
+            "file": self.path,
+        }
+
+    def _dump(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.prof"
+        self.path = os.path.join(self.out_dir, name)
+        self._profiler.dump_stats(self.path)
+        # Bounded retention: keep only the newest max_files profiles
+        files = [os.path.join(self.out_dir, f) for f in os.listdir(self.out_dir) if f.endswith(".prof")]
+        files.sort(key=os.path.getmtime)
+        for old in files[:-self.max_files]:
+            os.remove(old)
+
+
+def call_profiled(fn, *args):
+    """Run fn, under the active request profile if there is one."""
+    profile = active_profile.get()
+    if profile is None:
+        return fn(*args)
+    return profile.call(fn, *args)
+
+
+class Profiler:
+    def __init__(self, allowlist, out_dir: str = "./profiles", max_files: int = 50):
+        self.allowlist = frozenset(allowlist)
+        self.out_dir = out_dir
+        self.max_files = max(1, max_files)
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        allowlist = [u.strip() for u in os.getenv("PROFILE_ALLOWLIST", "").split(",") if u.strip()]
+        return cls(
+            allowlist,
+            out_dir=os.getenv("PROFILE_DIR", "./profiles"),
+            max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+        )
+
+    def for_request(self, user_id: str, header: str = None):
+        """Return a RequestProfile if this request opted in, else None."""
+        if not header or not self.allowlist or user_id not in self.allowlist:
+            return None
+        if header.lower() not in ("1", "true", "yes"):
+            return None
+        return RequestProfile(self.out_dir, self.max_files)
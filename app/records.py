@@ -0,0 +1,289 @@
+# records.py
+# Stream, filter and export stored Aadhaar records without loading them all.
+#
+# Run from the app directory, next to aadhaar_data.pkl / aadhaar_data.csv:
+#   python records.py export --source csv --pincode 110001 --format jsonl
+#   python records.py export --source redis --user-id u42 --format parquet --out u42.parquet
+#   python records.py reindex    # rebuild the VID / user ID indexes in Redis
+import os
+import re
+import sys
+import csv
+import json
+import pickle
+import argparse
+from itertools import islice
+from collections import Counter
+
+FIELDS = ["User ID", "Name", "DOB", "Gender", "Aadhaar Number", "VID", "Address", "Pincode", "timestamp"]
+# Record hashes are aadhaar:<number>; anything with a further ':' is bookkeeping
+RECORD_KEY = re.compile(r"aadhaar:[^:]+")
+RESERVED_KEYS = {"aadhaar:phash"}
+# Secondary indexes, kept in step with the records by persistence.Persister:
+# one hash of VID digits -> Aadhaar number, one set of numbers per user ID
+VID_INDEX = "aadhaar:idx:vid"
+USER_INDEX = "aadhaar:idx:user:{}"
+LOOKUP_KINDS = ("aadhaar", "vid", "user_id")
+
+
+# === Readers ===
+def iter_pickle_records(path: str):
+    """Yield records one pickle frame at a time. A frame may hold a single
+    record or a list of them; the original layout is one list frame."""
+    with open(path, "rb") as f:
+        while True:
+            try:
+                frame = pickle.load(f)
+            except EOFError:
+                return
+            if isinstance(frame, list):
+                yield from frame
+            else:
+                yield frame
+
+
+def iter_csv_records(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_redis_records(client, chunk: int = 1000):
+    """SCAN aadhaar:* and fetch each batch of hashes with one pipelined HGETALL."""
+    cursor = 0
+    while True:
+        cursor, keys = client.scan(cursor, match="aadhaar:*", count=chunk)
+        keys = [k for k in keys if RECORD_KEY.fullmatch(k) and k not in RESERVED_KEYS]
+        if keys:
+            pipe = client.pipeline(transaction=False)
+            for k in keys:
+                pipe.hgetall(k)
+            for record in pipe.execute():
+                if record:
+                    yield record
+        if cursor == 0:
+            return
+
+
+def redis_from_env():
+    """The API's Redis (main.py uses this too). REDIS_USERNAME= / REDIS_PASSWORD=
+    (empty) connect without AUTH."""
+    import redis
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        username=os.getenv("REDIS_USERNAME", "default") or None,
+        password=os.getenv("REDIS_PASSWORD", "hqpl@123") or None,
+        decode_responses=True,
+    )
+
+
+# === Bulk lookup ===
+def digits(value) -> str:
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def index_record(pipe, record: dict):
+    """Queue the index updates for one stored record on a Redis pipeline."""
+    number = record.get("Aadhaar Number")
+    if not number:
+        return
+    if digits(record.get("VID")):
+        pipe.hset(VID_INDEX, digits(record["VID"]), number)
+    if record.get("User ID"):
+        pipe.sadd(USER_INDEX.format(record["User ID"]), number)
+
+
+def lookup_redis(client, aadhaar=(), vid=(), user_id=()) -> dict:
+    """{kind: {key: [records]}} for every requested key, in two pipelined
+    round trips: one resolving VIDs and user IDs to numbers, one HGETALL
+    per distinct number. Unknown keys map to []."""
+    pipe = client.pipeline(transaction=False)
+    for v in vid:
+        pipe.hget(VID_INDEX, digits(v))
+    for u in user_id:
+        pipe.smembers(USER_INDEX.format(u))
+    resolved = pipe.execute() if vid or user_id else []
+    numbers = {"aadhaar": [[digits(a)] if digits(a) else [] for a in aadhaar]}
+    numbers["vid"] = [[n] if n else [] for n in resolved[:len(vid)]]
+    numbers["user_id"] = [sorted(ns) for ns in resolved[len(vid):]]
+
+    wanted = sorted({n for kind in LOOKUP_KINDS for ns in numbers[kind] for n in ns})
+    pipe = client.pipeline(transaction=False)
+    for n in wanted:
+        pipe.hgetall(f"aadhaar:{n}")
+    stored = dict(zip(wanted, pipe.execute())) if wanted else {}
+
+    keys = {"aadhaar": aadhaar, "vid": vid, "user_id": user_id}
+    return {
+        kind: {key: [stored[n] for n in ns if stored.get(n)] for key, ns in zip(keys[kind], numbers[kind])}
+        for kind in LOOKUP_KINDS
+    }
+
+
+def lookup_records(records, aadhaar=(), vid=(), user_id=()) -> dict:
+    """lookup_redis over any record stream, in one pass; the fallback when
+    Redis is down. A number stored twice resolves to its latest record."""
+    by_number = {digits(a): a for a in aadhaar}
+    by_vid = {digits(v): v for v in vid}
+    by_user = set(user_id)
+    found = {kind: {} for kind in LOOKUP_KINDS}
+    for record in records:
+        number = record.get("Aadhaar Number")
+        if number in by_number:
+            found["aadhaar"][by_number[number]] = record
+        v = digits(record.get("VID"))
+        if v and v in by_vid:
+            found["vid"][by_vid[v]] = record
+        if record.get("User ID") in by_user:
+            found["user_id"].setdefault(record["User ID"], {})[number] = record
+    return {
+        "aadhaar": {a: [found["aadhaar"][a]] if a in found["aadhaar"] else [] for a in aadhaar},
+        "vid": {v: [found["vid"][v]] if v in found["vid"] else [] for v in vid},
+        "user_id": {u: list(found["user_id"].get(u, {}).values()) for u in user_id},
+    }
+
+
+def reindex(args):
+    """Rebuild the secondary indexes from the stored hashes (records written
+    before the indexes existed, or after a Redis restore)."""
+    client = redis_from_env()
+    count = 0
+    for batch in chunks(iter_redis_records(client, chunk=args.chunk), args.chunk):
+        pipe = client.pipeline(transaction=False)
+        for record in batch:
+            index_record(pipe, record)
+        pipe.execute()
+        count += len(batch)
+    print(f"Indexed {count} records")
+
+
+def open_source(args):
+    if args.source == "pkl":
+        return iter_pickle_records(args.path or "./aadhaar_data.pkl")
+    if args.source == "csv":
+        return iter_csv_records(args.path or "./aadhaar_data.csv")
+    return iter_redis_records(redis_from_env(), chunk=args.chunk)
+
+
+# === Filters ===
+def matches(record: dict, args) -> bool:
+    if args.user_id and record.get("User ID") != args.user_id:
+        return False
+    if args.pincode and record.get("Pincode") != args.pincode:
+        return False
+    if args.since or args.until:
+        # Only records that carry an ISO timestamp can be date-filtered
+        ts = record.get("timestamp") or ""
+        if not ts:
+            return False
+        if args.since and ts[:len(args.since)] < args.since:
+            return False
+        if args.until and ts[:len(args.until)] > args.until:
+            return False
+    return True
+
+
+def filtered(records, args, counts: Counter):
+    """Records passing the filters. Records without a timestamp cannot pass a
+    date filter; they are counted so export() can say so instead of
+    silently returning nothing."""
+    for record in records:
+        if (args.since or args.until) and not record.get("timestamp"):
+            counts["undated"] += 1
+            continue
+        if matches(record, args):
+            counts["matched"] += 1
+            yield record
+
+
+def chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# === Writers ===
+def write_jsonl(batches, out, fields):
+    for batch in batches:
+        out.write("".join(json.dumps({k: r.get(k) for k in fields}, ensure_ascii=False) + "\n" for r in batch))
+
+
+def write_csv(batches, out, fields):
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+
+
+def write_parquet(batches, path, fields):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet export needs pyarrow: pip install pyarrow")
+    schema = pa.schema([(f, pa.string()) for f in fields])
+    # One row group per chunk keeps memory bounded by --chunk
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = {f: [None if r.get(f) is None else str(r.get(f)) for r in batch] for f in fields}
+            writer.write_table(pa.table(columns, schema=schema))
+
+
+def export(args):
+    fields = args.fields.split(",") if args.fields else FIELDS
+    counts = Counter()
+    records = filtered(open_source(args), args, counts)
+    if args.limit:
+        records = islice(records, args.limit)
+    batches = chunks(records, args.chunk)
+
+    if args.format == "parquet":
+        if args.out == "-":
+            sys.exit("Parquet export needs --out")
+        write_parquet(batches, args.out, fields)
+    else:
+        out = sys.stdout if args.out == "-" else open(args.out, "w", newline="", encoding="utf-8")
+        try:
+            (write_csv if args.format == "csv" else write_jsonl)(batches, out, fields)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    if counts["undated"]:
+        message = f"{counts['undated']} records have no timestamp and were left out by --since/--until"
+        if not counts["matched"]:
+            sys.exit(message)
+        print(f"Warning: {message}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and export stored Aadhaar records")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="stream records matching the filters")
+    p.add_argument("--source", choices=["pkl", "csv", "redis"], default="pkl")
+    p.add_argument("--path", help="pickle/CSV file (defaults to the API's data files)")
+    p.add_argument("--user-id")
+    p.add_argument("--pincode")
+    p.add_argument("--since", help="ISO date/time prefix, inclusive")
+    p.add_argument("--until", help="ISO date/time prefix, inclusive")
+    p.add_argument("--format", choices=["jsonl", "csv", "parquet"], default="jsonl")
+    p.add_argument("--out", default="-", help="output file, '-' for stdout")
+    p.add_argument("--fields", help="comma-separated columns to export")
+    p.add_argument("--chunk", type=int, default=1000, help="records per batch / SCAN page")
+    p.add_argument("--limit", type=int)
+    p.set_defaults(func=export)
+
+    p = sub.add_parser("reindex", help="rebuild the Redis VID / user ID indexes")
+    p.add_argument("--chunk", type=int, default=1000, help="records per SCAN page / pipeline")
+    p.set_defaults(func=reindex)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# replay.py
+# Re-run field extraction over recorded OCR output (see ocr_corpus.py).
+#
+# Run from the app directory:
+#   python replay.py --corpus ocr_records/ocr_corpus.sqlite --extractor main --write-golden golden_main.jsonl
+#   python replay.py --corpus ocr_records/ocr_corpus.sqlite --extractor main --golden golden_main.jsonl
+# Exits 1 when any field differs from the golden file.
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+
+from ocr_corpus import OcrCorpus
+
+
+# === Extractors: (front_text, back_text) -> dict of fields ===
+def main_extractor():
+    from extraction import extract_info
+    return lambda front, back: extract_info(front, back)
+
+
+def fields_extractor():
+    # OCR/ uses flat imports; extract_fields has no dependencies of its own
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "OCR"))
+    from extract_fields import extract_fields
+    return lambda front, back: extract_fields(front + "\n" + back)
+
+
+def llm_extractor():
+    import openai
+    from extraction import llm_extract, LLMResponseError
+    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def run(front, back):
+        try:
+            return llm_extract(client, front + "\n" + back)
+        except LLMResponseError as e:
+            return {"error": str(e)}
+    return run
+
+
+EXTRACTORS = {"main": main_extractor, "fields": fields_extractor, "llm": llm_extractor}
+
+
+# === Golden files ===
+def load_golden(path: str) -> dict:
+    golden = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                golden[(entry["card_id"], entry["engine"])] = entry["fields"]
+    return golden
+
+
+def diff_fields(expected: dict, actual: dict) -> dict:
+    """{field: (expected, actual)} for every field that differs."""
+    return {k: (expected.get(k), actual.get(k)) for k in sorted(set(expected) | set(actual)) if expected.get(k) != actual.get(k)}
+
+
+def replay(args) -> int:
+    extract = EXTRACTORS[args.extractor]()
+    golden = load_golden(args.golden) if args.golden else None
+    out = open(args.write_golden, "w", encoding="utf-8") if args.write_golden else None
+
+    corpus = OcrCorpus(args.corpus)
+    cards, changed, missing = 0, 0, 0
+    field_diffs = Counter()
+    extract_time = 0.0
+    start = time.perf_counter()
+    try:
+        for card_id, engine, front, back in corpus.cards(args.engine, args.limit):
+            t = time.perf_counter()
+            for _ in range(args.repeat):
+                fields = extract(front, back)
+            extract_time += time.perf_counter() - t
+            cards += 1
+            if out:
+                out.write(json.dumps({"card_id": card_id, "engine": engine, "fields": fields}, ensure_ascii=False) + "\n")
+            if golden is None:
+                continue
+            expected = golden.get((card_id, engine))
+            if expected is None:
+                missing += 1
+                continue
+            diff = diff_fields(expected, fields)
+            if diff:
+                changed += 1
+                field_diffs.update(diff.keys())
+                if changed <= args.show:
+                    print(f"{card_id[:12]} {engine}")
+                    for k, (old, new) in diff.items():
+                        print(f"    {k}: {old!r} -> {new!r}")
+    finally:
+        corpus.close()
+        if out:
+            out.close()
+    total = time.perf_counter() - start
+
+    calls = cards * args.repeat
+    print(f"{cards} cards, extractor={args.extractor}, engine={args.engine or 'all'}")
+    if calls:
+        print(f"extractor: {calls / extract_time:,.0f} cards/s ({extract_time / calls * 1e6:,.0f} us/card); "
+              f"total with corpus reads {total:.2f}s")
+    if golden is not None:
+        print(f"golden: {cards - changed - missing} same, {changed} changed, {missing} not in golden")
+        for field, n in field_diffs.most_common():
+            print(f"    {field}: {n}")
+    return 1 if changed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded OCR text through an extractor")
+    parser.add_argument("--corpus", default=os.path.join(os.getenv("OCR_RECORD_DIR", "./ocr_records"), "ocr_corpus.sqlite"))
+    parser.add_argument("--extractor", choices=sorted(EXTRACTORS), default="main")
+    parser.add_argument("--engine", help="only cards OCR'd by this engine (docling, tesseract, docling@1200, ...)")
+    parser.add_argument("--golden", help="JSONL of expected fields to diff against")
+    parser.add_argument("--write-golden", help="write this run's fields as a golden JSONL")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--repeat", type=int, default=1, help="extractor calls per card, for steadier timings")
+    parser.add_argument("--show", type=int, default=20, help="changed cards to print in full")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.corpus):
+        sys.exit(f"No corpus at {args.corpus}")
+    sys.exit(replay(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# shm_transport.py
+# Hand decoded images to OCR worker processes through shared memory.
+import os
+import re
+import sys
+import uuid
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from PIL import Image
+
+PREFIX = "aadhaar_img"
+SHM_DIR = "/dev/shm"
+
+# What actually crosses the process boundary: a name and a few ints
+ImageHandle = namedtuple("ImageHandle", ["name", "shape", "mode"])
+
+
+def share_image(img: Image.Image):
+    """Copy pixels into a new shared memory segment. The caller owns it."""
+    if img.mode not in ("L", "RGB", "RGBA"):
+        img = img.convert("RGB")
+    arr = np.asarray(img)
+    # The pid in the name lets sweep_stale() find segments of dead processes
+    name = f"{PREFIX}_{os.getpid()}_{uuid.uuid4().hex[:12]}"
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=np.uint8, buffer=shm.buf)[...] = arr
+    return shm, ImageHandle(shm.name, arr.shape, img.mode)
+
+
+@contextmanager
+def shared_images(*images):
+    """Place images in shared memory for the duration of the block.
+
+    Segments are unlinked by the creating process on exit, including when
+    the worker crashed; if this process dies instead, multiprocessing's
+    resource tracker unlinks them."""
+    segments, handles = [], []
+    try:
+        for img in images:
+            shm, handle = share_image(img)
+            segments.append(shm)
+            handles.append(handle)
+        yield handles
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+
+def _attach(name: str):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Before 3.13 attaching registers the segment with the resource tracker.
+    # Spawned pool workers share the parent's tracker, where the creator's
+    # unlink() balances that registration; only a tracker started here (an
+    # unrelated process) would unlink the segment when we exit.
+    inherited = getattr(resource_tracker._resource_tracker, "_fd", None) is not None
+    shm = shared_memory.SharedMemory(name=name)
+    if not inherited:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+@contextmanager
+def attached_images(handles):
+    """Worker side: map the segments and wrap them as PIL images.
+
+    L and RGBA images wrap the shared buffer without copying; PIL keeps RGB
+    at 4 bytes per pixel, so those are copied once, locally. The images must
+    not be used after the block ends."""
+    segments, images = [], []
+    try:
+        for handle in handles:
+            shm = _attach(handle.name)
+            segments.append(shm)
+            images.append(Image.fromarray(np.ndarray(handle.shape, dtype=np.uint8, buffer=shm.buf)))
+        yield images
+    finally:
+        del images[:]
+        for shm in segments:
+            try:
+                shm.close()
+            except BufferError:
+                logging.warning(f"Shared image {shm.name} still referenced at close")
+
+
+def sweep_stale():
+    """Unlink segments left behind by processes that no longer exist."""
+    if not os.path.isdir(SHM_DIR):
+        return
+    for entry in os.listdir(SHM_DIR):
+        m = re.fullmatch(rf"{PREFIX}_(\d+)_[0-9a-f]+", entry)
+        if not m:
+            continue
+        try:
+            os.kill(int(m.group(1)), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(os.path.join(SHM_DIR, entry))
+                logging.info(f"Removed stale shared image {entry}")
+            except OSError:
+                pass
+        except PermissionError:
+            pass  # alive, owned by someone else
@@ -0,0 +1,151 @@
+# singleflight.py
+# Coalesce identical in-flight requests onto a single pipeline run.
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from metrics import COALESCED
+import deadline
+from deadline import DeadlineExceeded
+
+# Deletes the lock only if we still own it
+_UNLOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class SingleFlight:
+    """Within a worker, concurrent calls with the same key await one shared
+    future. Across workers (when Redis is configured) the first caller takes a
+    lock holding a fresh run token, runs the work and publishes the JSON
+    result under that token; the others wait for that run's result and fall
+    back to running the work themselves if the owner disappears."""
+
+    def __init__(self, redis_client=None, prefix: str = "singleflight", lock_ttl: float = 120, result_ttl: int = 30):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self._calls = {}
+
+    async def do(self, key: str, fn):
+        """Run `await fn()` once per key at a time and share its result."""
+        while key in self._calls:
+            fut = self._calls[key]
+            try:
+                result = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    continue  # the owner gave up (client gone, deadline); try again
+                raise
+            COALESCED.labels("local").inc()
+            return result
+
+        fut = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting; don't warn about an unretrieved exception
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = fut
+        try:
+            result = await self._run(key, fn)
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # The owner ran out of its own time; waiters with more try again
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    async def _run(self, key: str, fn):
+        if self.redis is None:
+            return await fn()
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        lock_key = f"{self.prefix}:lock:{digest}"
+        token = uuid.uuid4().hex
+        try:
+            owner = await run_in_threadpool(self.redis.set, lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            logging.warning(f"Single-flight lock unavailable: {e}")
+            return await fn()
+
+        if not owner:
+            message = await run_in_threadpool(self._wait_remote, lock_key)
+            if message and "result" in message:
+                COALESCED.labels("redis").inc()
+                return message["result"]
+            if message and "error" in message:
+                COALESCED.labels("redis").inc()
+                raise HTTPException(status_code=message["error"]["status"], detail=message["error"]["detail"])
+            return await fn()
+
+        message = {"retry": True}
+        try:
+            result = await fn()
+            message = {"result": result}
+            return result
+        except DeadlineExceeded:
+            raise  # published as a retry
+        except HTTPException as e:
+            message = {"error": {"status": e.status_code, "detail": e.detail}}
+            raise
+        finally:
+            await run_in_threadpool(self._publish, lock_key, token, message)
+
+    def _publish(self, lock_key: str, token: str, message: dict):
+        try:
+            payload = json.dumps(message)
+        except (TypeError, ValueError):
+            payload = json.dumps({"retry": True})
+        try:
+            pipe = self.redis.pipeline()
+            # Kept briefly for waiters that subscribe after the publish
+            pipe.set(f"{self.prefix}:result:{token}", payload, ex=self.result_ttl)
+            pipe.publish(f"{self.prefix}:done:{token}", payload)
+            pipe.eval(_UNLOCK, 1, lock_key, token)
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Single-flight publish failed: {e}")
+
+    def _wait_remote(self, lock_key: str):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            # Only the run holding the lock now counts: a result left behind by
+            # an earlier run of the same key may predate what that run changed
+            token = self.redis.get(lock_key)
+            if token is None:
+                return None  # released meanwhile; its result is not ours to take
+            if isinstance(token, bytes):
+                token = token.decode()
+            result_key = f"{self.prefix}:result:{token}"
+            pubsub.subscribe(f"{self.prefix}:done:{token}")
+            # Never longer than the owner may hold the lock, nor than this
+            # request has left; a disconnect ends the wait at the next poll
+            expires = time.monotonic() + self.lock_ttl
+            while time.monotonic() < expires:
+                deadline.check("coalesce")
+                cached = self.redis.get(result_key)
+                if cached:
+                    return json.loads(cached)
+                msg = pubsub.get_message(timeout=max(0.01, min(1.0, deadline.remaining(1.0))))
+                if msg and msg["type"] == "message":
+                    return json.loads(msg["data"])
+                if not self.redis.exists(lock_key):
+                    # Owner finished or died; take one last look for its result
+                    cached = self.redis.get(result_key)
+                    return json.loads(cached) if cached else None
+            return None
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.warning(f"Single-flight wait failed: {e}")
+            return None
+        finally:
+            pubsub.close()
@@ -0,0 +1,69 @@
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+from PIL import Image
+
+# Benchmark: docling's default DocumentConverter + markdown export (what
+# main.py used to run) vs the card profile from app/card_converter.py, on the
+# sample cards in downloads/ and OCR/images/.
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "app"))
+from docling.document_converter import DocumentConverter  # noqa: E402
+from card_converter import build_card_converter, card_lines, lines_text  # noqa: E402
+
+AADHAAR = re.compile(r"\b\d{4} ?\d{4} ?\d{4}\b")
+
+
+def default_text(converter, path):
+    return converter.convert(path).document.export_to_markdown()
+
+
+def card_text(converter, path):
+    return lines_text(card_lines(converter.convert(path), Image.open(path).size))
+
+
+def bench(fn, converter, path, rounds):
+    text = fn(converter, path)  # warm-up: model load and first-call caches
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(converter, path)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=int(os.getenv("DOCLING_NUM_THREADS", "4")))
+    parser.add_argument("images", nargs="*", help="defaults to downloads/* and OCR/images/*")
+    args = parser.parse_args()
+
+    images = args.images or sorted(
+        glob.glob(os.path.join(ROOT, "downloads", "*.jpg")) + glob.glob(os.path.join(ROOT, "OCR", "images", "*.png"))
+    )
+    if not images:
+        sys.exit("No sample images found")
+
+    default = DocumentConverter()
+    card = build_card_converter(args.threads)
+    print(f"{len(images)} images, {args.rounds} rounds, card profile with {args.threads} threads")
+    print(f"{'image':<20} {'default ms':>11} {'card ms':>9} {'speedup':>8}  aadhaar (default / card)")
+    totals = [0.0, 0.0]
+    for path in images:
+        base_ms, base_text = bench(default_text, default, path, args.rounds)
+        card_ms, text = bench(card_text, card, path, args.rounds)
+        totals[0] += base_ms
+        totals[1] += card_ms
+        found = [m.group(0) if m else "-" for m in (AADHAAR.search(base_text), AADHAAR.search(text))]
+        print(f"{os.path.basename(path):<20} {base_ms:11.0f} {card_ms:9.0f} {base_ms / card_ms:7.2f}x  {found[0]} / {found[1]}")
+    print(f"{'total':<20} {totals[0]:11.0f} {totals[1]:9.0f} {totals[0] / totals[1]:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
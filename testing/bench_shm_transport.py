@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Benchmark: handing decoded card images to OCR worker processes by pickling
+# (the ProcessPoolExecutor default) vs shared memory handles.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from shm_transport import shared_images, attached_images  # noqa: E402
+
+
+def touch_pickled(images):
+    # Stand-in for OCR: read every pixel once so both paths pay for access
+    return [int(np.asarray(img)[::64, ::64].sum()) for img in images]
+
+
+def touch_shared(handles):
+    with attached_images(handles) as images:
+        return [int(np.asarray(img)[::64, ::64].sum()) for img in images]
+
+
+def bench(label, fn, rounds):
+    fn()  # warm-up: worker start and imports
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    per_call = (time.perf_counter() - start) / rounds * 1000
+    print(f"{label:<10} {per_call:8.2f} ms per front+back handoff")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=2400, help="2x-upscaled 1200px card")
+    parser.add_argument("--height", type=int, default=1600)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    front = Image.fromarray(rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8))
+    back = Image.fromarray(rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8))
+    mb = 2 * args.width * args.height * 3 / 1e6
+    print(f"{args.width}x{args.height} RGB, {mb:.1f} MB per request, {args.rounds} rounds")
+
+    # Same start method as app/main.py's OCR pool
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        def pickled():
+            return pool.submit(touch_pickled, [front, back]).result()
+
+        def shared():
+            with shared_images(front, back) as handles:
+                return pool.submit(touch_shared, handles).result()
+
+        assert pickled() == shared()
+        base = bench("pickle", pickled, args.rounds)
+        shm = bench("shm", shared, args.rounds)
+    print(f"speedup    {base / shm:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler, BaseHTTPRequestHandler
+
+# Load test for app/main.py and app/app.py with no outside services.
+#
+#   python testing/loadtest.py --app main --concurrency 8 --requests 200
+#   python testing/loadtest.py --app app --rate 5 --duration 60 --workers 2
+#   python testing/loadtest.py --app main --workload records --batch 1000 --concurrency 32
+#
+# Starts on free local ports:
+#   - a static server for the dataset/ card images (front_url / back_url)
+#   - Redis: an in-process fakeredis server (--redis fake), a local
+#     redis-server (--redis server), or none (--redis none: the apps' fallbacks)
+#   - a stub chat-completions server for app.py (OPENAI_BASE_URL) that answers
+#     after --llm-latency seconds with a card carrying a fresh Aadhaar number
+# then the app under uvicorn with --workers, in a scratch directory so its
+# data files stay out of the tree. Closed loop (--concurrency N: N clients
+# back to back) or open loop (--rate R: Poisson arrivals at R/s, latency
+# measured from the scheduled send time so queueing shows up).
+#
+# Needs httpx, psutil and uvicorn; fakeredis (with lupa) for --redis fake.
+# fakeredis is pure Python and single-threaded in effect: Redis-heavy runs
+# (--workload records) measure it as much as the app, so size those with
+# --redis server.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP_DIR = os.path.join(ROOT, "app")
+DATASET = os.path.join(ROOT, "dataset", "new_generated_aadharcard_images")
+CARD_FILE = re.compile(r"(\d+)(front|backside)_(.+)\.(?:jpe?g|png)$")
+
+FAKEREDIS_SERVER = (
+    "import sys; from fakeredis import TcpFakeServer; "
+    "s = TcpFakeServer(('127.0.0.1', int(sys.argv[1])), server_type='redis'); "
+    "s.daemon_threads = True; s.serve_forever()"
+)
+
+APPS = {
+    # app module, upload path
+    "main": ("main:app", "/upload_url"),
+    "app": ("app:app", "/upload_url/"),
+}
+
+
+def require(module: str):
+    try:
+        return __import__(module)
+    except ImportError:
+        sys.exit(f"The load test needs {module}: pip install {module}")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(handler, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"serve:{port}", daemon=True).start()
+    return server
+
+
+# === Fixtures ===
+class QuietImages(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def card_pairs(directory: str):
+    """(front, back) file names matched on card number and augmentation."""
+    sides = {}
+    for name in sorted(os.listdir(directory)):
+        m = CARD_FILE.match(name)
+        if m:
+            sides.setdefault((m.group(1), m.group(3)), {})[m.group(2)] = name
+    return [(s["front"], s["backside"]) for s in sides.values() if len(s) == 2]
+
+
+class StubChatCompletions(BaseHTTPRequestHandler):
+    """POST /v1/chat/completions in the OpenAI response shape. The Aadhaar
+    number is random so app.py's CSV duplicate check doesn't short-circuit
+    every request after the first."""
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.latency)
+        card = {
+            "Name": "Load Test", "DOB": "01/01/1990", "Gender": "Male",
+            "Aadhaar Number": str(random.randrange(2 * 10**11, 10**12)),
+            "VID": str(random.randrange(10**15, 10**16)),
+            "Address": "1 Test Street, New Delhi", "Pincode": "110001",
+        }
+        body = json.dumps({
+            "id": "chatcmpl-loadtest", "object": "chat.completion", "created": int(time.time()), "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": json.dumps(card)}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_redis(kind: str, scratch: str):
+    """(port, stop) for the chosen Redis; port points at nothing for 'none'."""
+    port = free_port()
+    if kind == "none":
+        return port, lambda: None
+    if kind == "server":
+        if not shutil.which("redis-server"):
+            sys.exit("--redis server needs redis-server on PATH")
+        proc = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no", "--dir", scratch],
+            stdout=subprocess.DEVNULL,
+        )
+        wait_port(port, proc)
+        return port, proc.terminate
+    require("fakeredis")
+    # Own process: the fake is pure Python and would share the load
+    # generator's GIL otherwise
+    proc = subprocess.Popen([sys.executable, "-c", FAKEREDIS_SERVER, str(port)])
+    wait_port(port, proc)
+    return port, proc.terminate
+
+
+def wait_port(port: int, proc: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"Redis stand-in exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit(f"Redis stand-in not listening on {port} after {timeout:g}s")
+
+
+def seed_records(port: int, count: int, args):
+    """Store `count` synthetic records (hashes plus /records indexes) for the
+    records workload, spread over the same user IDs it queries."""
+    redis = require("redis")
+    sys.path.insert(0, os.path.abspath(APP_DIR))
+    from records import index_record
+    client = redis.Redis(host="127.0.0.1", port=port, decode_responses=True)
+    pipe = client.pipeline(transaction=False)
+    for i in range(count):
+        record = {"User ID": f"{args.user_prefix}{i % args.users}", "Name": "Load Test",
+                  "Aadhaar Number": str(2 * 10**11 + i), "VID": str(10**15 + i), "Pincode": "110001"}
+        pipe.hset(f"aadhaar:{record['Aadhaar Number']}", mapping=record)
+        index_record(pipe, record)
+        if i % 1000 == 999:
+            pipe.execute()
+    pipe.execute()
+
+
+def start_app(args, env: dict, scratch: str, port: int) -> subprocess.Popen:
+    module, _ = APPS[args.app]
+    cmd = [sys.executable, "-m", "uvicorn", module, "--app-dir", os.path.abspath(APP_DIR),
+           "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"]
+    log = open(os.path.join(scratch, "app.log"), "wb")
+    return subprocess.Popen(cmd, cwd=scratch, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(httpx, base: str, proc: subprocess.Popen, timeout: float):
+    # /metrics exists on both apps and touches no dependencies
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited with {proc.returncode} during startup")
+        try:
+            if httpx.get(base + "/metrics", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"App not ready after {timeout:g}s")
+
+
+# === Resource usage ===
+class ResourceSampler(threading.Thread):
+    """CPU seconds and peak RSS of the uvicorn process tree, sampled so that
+    workers (and OCR pool processes) that come and go are still counted."""
+
+    def __init__(self, psutil, pid: int, interval: float = 0.5):
+        super().__init__(name="sampler", daemon=True)
+        self.psutil = psutil
+        self.pid = pid
+        self.interval = interval
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def sample(self):
+        try:
+            root = self.psutil.Process(self.pid)
+            procs = [root] + root.children(recursive=True)
+        except self.psutil.Error:
+            return
+        for p in procs:
+            try:
+                with p.oneshot():
+                    times = p.cpu_times()
+                    cpu, rss, ppid = times.user + times.system, p.memory_info().rss, p.ppid()
+            except self.psutil.Error:
+                continue
+            with self._lock:
+                s = self.stats.get(p.pid)
+                if s is None:
+                    role = "master" if p.pid == self.pid else "worker" if ppid == self.pid else "child"
+                    s = self.stats[p.pid] = {"role": role, "cpu0": cpu, "cpu": cpu, "rss": rss}
+                s["cpu"] = cpu
+                s["rss"] = max(s["rss"], rss)
+
+    def reset(self):
+        """Start measuring from now (after warm-up)."""
+        self.sample()
+        with self._lock:
+            for s in self.stats.values():
+                s["cpu0"] = s["cpu"]
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> dict:
+        self._done.set()
+        self.join()
+        self.sample()
+        with self._lock:
+            return {pid: {"role": s["role"], "cpu_s": s["cpu"] - s["cpu0"], "peak_rss_mb": s["rss"] / 2**20}
+                    for pid, s in self.stats.items()}
+
+
+# === Load ===
+def request_maker(args, images_base: str):
+    """i -> (method, path, json body) for the chosen workload."""
+    _, upload_path = APPS[args.app]
+    if args.workload == "records":
+        def records(i):
+            users = [f"{args.user_prefix}{random.randrange(args.users)}" for _ in range(args.batch)]
+            return "POST", "/records", {"user_id": users}
+        return records
+
+    pairs = card_pairs(DATASET)
+    if args.cards:
+        pairs = pairs[:args.cards]
+    if not pairs:
+        sys.exit(f"No front/back card pairs in {DATASET}")
+
+    def upload(i):
+        front, back = pairs[i % len(pairs)]
+        body = {"user_id": f"{args.user_prefix}{i % args.users}",
+                "front_url": f"{images_base}/{front}", "back_url": f"{images_base}/{back}"}
+        if args.mode:
+            body["mode"] = args.mode
+        return "POST", upload_path, body
+    return upload
+
+
+def outcome(resp) -> str:
+    """HTTP status, plus the body's own status for 200s (app.py answers
+    failures with 200 {"status": "error"})."""
+    if resp.status_code != 200:
+        return str(resp.status_code)
+    try:
+        status = resp.json().get("status")
+    except ValueError:
+        status = None
+    return f"200 {status}" if status else "200"
+
+
+def is_error(result: str) -> bool:
+    return not result.startswith("2") or result.endswith(" error")
+
+
+async def send(client, make, i: int, start: float, results: list):
+    method, path, body = make(i)
+    try:
+        resp = await client.request(method, path, json=body)
+        result = outcome(resp)
+    except Exception as e:
+        result = f"transport {type(e).__name__}"
+    results.append((time.perf_counter() - start, result))
+
+
+async def closed_loop(client, make, args, first: int, count: int, duration: float, results: list):
+    counter = iter(range(first, first + count) if count else range(first, sys.maxsize))
+    stop_at = time.perf_counter() + duration if duration else float("inf")
+
+    async def user():
+        for i in counter:
+            if time.perf_counter() >= stop_at:
+                return
+            await send(client, make, i, time.perf_counter(), results)
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+
+
+async def open_loop(client, make, args, first: int, count: int, duration: float, results: list):
+    begin = time.perf_counter()
+    scheduled, tasks, i = begin, [], first
+    while (not count or i < first + count) and (not duration or scheduled - begin < duration):
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Latency counts from the scheduled arrival, not from when we got to it
+        tasks.append(asyncio.ensure_future(send(client, make, i, scheduled, results)))
+        i += 1
+        scheduled += random.expovariate(args.rate)
+    await asyncio.gather(*tasks)
+
+
+async def drive(httpx, base: str, make, args, sampler: ResourceSampler):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=args.timeout, limits=limits) as client:
+        loop = open_loop if args.rate else closed_loop
+        if args.warmup:
+            await loop(client, make, args, 0, args.warmup, 0, [])
+        sampler.reset()
+        results = []
+        start = time.perf_counter()
+        await loop(client, make, args, args.warmup, args.requests, args.duration, results)
+        return results, time.perf_counter() - start
+
+
+# === Report ===
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def summarize(args, results, elapsed, procs) -> dict:
+    latencies = sorted(t for t, _ in results)
+    outcomes = Counter(r for _, r in results)
+    errors = sum(n for r, n in outcomes.items() if is_error(r))
+    return {
+        "app": args.app, "workload": args.workload, "workers": args.workers, "redis": args.redis,
+        "load": f"open {args.rate:g}/s" if args.rate else f"closed x{args.concurrency}",
+        "requests": len(results), "seconds": elapsed, "rps": len(results) / elapsed if elapsed else 0.0,
+        "latency": {f"p{q:g}": percentile(latencies, q) for q in (50, 90, 95, 99)} | {"max": latencies[-1] if latencies else 0.0},
+        "outcomes": dict(outcomes.most_common()), "errors": errors,
+        "error_rate": errors / len(results) if results else 0.0,
+        "processes": {str(pid): p | {"cpu_pct": 100 * p["cpu_s"] / elapsed if elapsed else 0.0} for pid, p in procs.items()},
+    }
+
+
+def print_report(s: dict):
+    lat = s["latency"]
+    print(f"{s['app']} {s['workload']}, {s['load']}, {s['workers']} worker(s), redis={s['redis']}")
+    print(f"requests  {s['requests']} in {s['seconds']:.1f}s = {s['rps']:.2f} req/s")
+    print("latency   " + "  ".join(f"{k} {v * 1000:,.0f}ms" for k, v in lat.items()))
+    print("outcomes  " + "  ".join(f"{k}: {n}" for k, n in s["outcomes"].items()))
+    print(f"errors    {s['errors']} ({s['error_rate']:.1%})")
+    print(f"{'pid':>9}  {'role':<7}{'cpu s':>8}{'cpu %':>8}{'peak RSS':>11}")
+    for pid, p in sorted(s["processes"].items(), key=lambda kv: (kv[1]["role"], kv[0])):
+        print(f"{pid:>9}  {p['role']:<7}{p['cpu_s']:>8.1f}{p['cpu_pct']:>8.1f}{p['peak_rss_mb']:>8.0f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Aadhaar APIs against local stand-ins")
+    parser.add_argument("--app", choices=sorted(APPS), default="main")
+    parser.add_argument("--workload", choices=["upload", "records"], default="upload",
+                        help="records: bulk POST /records lookups (main only)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="closed loop: clients sending back to back")
+    load.add_argument("--rate", type=float, help="open loop: Poisson arrivals per second")
+    parser.add_argument("--requests", type=int, default=100, help="measured requests (0: until --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0: after --requests)")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests first")
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per request")
+    parser.add_argument("--mode", help="main.py pipeline mode (fast, balanced, accurate)")
+    parser.add_argument("--cards", type=int, help="cycle through only the first N card pairs")
+    parser.add_argument("--users", type=int, default=1000, help="distinct user IDs to spread requests over")
+    parser.add_argument("--user-prefix", default="load-")
+    parser.add_argument("--batch", type=int, default=100, help="user IDs per /records call")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic records to store in Redis first")
+    parser.add_argument("--redis", choices=["fake", "server", "none"], default="fake")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub chat-completions delay, seconds")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app environment")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory (app.log, data files)")
+    parser.add_argument("--json", help="also write the summary here")
+    args = parser.parse_args(argv)
+    if args.workload == "records" and args.app != "main":
+        parser.error("--workload records needs --app main")
+    if not args.requests and not args.duration:
+        parser.error("set --requests or --duration")
+    if args.seed and args.redis == "none":
+        parser.error("--seed needs Redis")
+    if args.rate:
+        args.concurrency = max(args.concurrency, 64)  # keep-alive pool only
+
+    httpx, psutil = require("httpx"), require("psutil")
+    require("uvicorn")
+    scratch = tempfile.mkdtemp(prefix="aadhaar-load-")
+    images = serve(partial(QuietImages, directory=DATASET), free_port())
+    StubChatCompletions.latency = args.llm_latency
+    llm = serve(StubChatCompletions, free_port())
+    redis_port, stop_redis = start_redis(args.redis, scratch)
+    if args.seed:
+        seed_records(redis_port, args.seed, args)
+
+    env = dict(os.environ)
+    env.update({
+        "REDIS_HOST": "127.0.0.1", "REDIS_PORT": str(redis_port), "REDIS_USERNAME": "", "REDIS_PASSWORD": "",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm.server_port}/v1", "OPENAI_API_KEY": "load-test",
+    })
+    env.pop("OCR_RECORD_DIR", None)
+    # Fresh per run: /metrics then aggregates every worker (see app/metrics.py)
+    env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(scratch, "prometheus")
+    os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+    env.update(kv.split("=", 1) for kv in args.env)
+
+    port = free_port()
+    proc = start_app(args, env, scratch, port)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(httpx, base, proc, timeout=300)
+        sampler = ResourceSampler(psutil, proc.pid)
+        sampler.start()
+        make = request_maker(args, f"http://127.0.0.1:{images.server_port}")
+        results, elapsed = asyncio.run(drive(httpx, base, make, args, sampler))
+        summary = summarize(args, results, elapsed, sampler.stop())
+    except RuntimeError as e:
+        sys.exit(f"{e}; see {os.path.join(scratch, 'app.log')}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        images.shutdown()
+        llm.shutdown()
+        stop_redis()
+
+    print_report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.keep:
+        print(f"scratch: {scratch}")
+    else:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
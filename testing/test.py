@@ -1,10 +1,13 @@
 import os
+import sys
 import requests
 from PIL import Image
 from io import BytesIO
-from docling.document_converter import DocumentConverter
 import torch
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from card_converter import build_card_converter, card_lines  # noqa: E402
+
 # Check PyTorch CUDA availability
 if torch.cuda.is_available():
     print("[WARNING] CUDA is available! Forcing CPU mode, but torch sees GPU. This may cause OOM errors.")
@@ -32,12 +35,13 @@ for name, url in image_urls.items():
     else:
         print(f"Failed to download {name} image.")
 
-# Initialize docling DocumentConverter
-converter = DocumentConverter()
+# Initialize docling with the card profile used by app/main.py
+converter = build_card_converter()
 
 # Extract text from both images
 for name in image_urls.keys():
     image_path = f"downloads/{name}.jpg"
     result = converter.convert(image_path)
     print(f"\nExtracted Text from {name.capitalize()} Image:")
-    print(result.document.export_to_markdown())
+    for line in card_lines(result, Image.open(image_path).size):
+        print(f"{line.bbox}  {line.text}")
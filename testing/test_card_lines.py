@@ -0,0 +1,34 @@
+import os
+import sys
+
+# Run with: python -m pytest testing/test_card_lines.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from card_converter import CardLine, group_cells  # noqa: E402
+
+
+def cell(text, x0, x1, y0, h=20):
+    return CardLine(text, (x0, y0, x1, y0 + h))
+
+
+def texts(lines):
+    return [line.text for line in lines]
+
+
+def test_jittered_cells_keep_reading_order():
+    cells = [cell("1234", 10, 80, 101), cell("5678", 90, 160, 99), cell("9012", 170, 240, 100)]
+    assert texts(group_cells(cells)) == ["1234 5678 9012"]
+
+
+def test_row_bbox_spans_its_cells():
+    lines = group_cells([cell("DOB:", 10, 60, 101), cell("01/01/1990", 70, 190, 99)])
+    assert lines[0].bbox == (10, 99, 190, 121)
+
+
+def test_photo_column_stays_apart():
+    cells = [cell("Name", 300, 380, 50), cell("Kumar", 390, 470, 51), cell("[photo]", 10, 60, 52)]
+    assert texts(group_cells(cells)) == ["[photo]", "Name Kumar"]
+
+
+def test_rows_one_line_apart_stay_separate():
+    cells = [cell("Male", 10, 80, 25), cell("Ravi", 10, 80, 0), cell("Kumar", 90, 170, 2)]
+    assert texts(group_cells(cells)) == ["Ravi Kumar", "Male"]
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+
+# Run with: python -m pytest testing/test_line_grouping.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "OCR"))
+from line_grouping import group_lines  # noqa: E402
+
+
+def box(x0, x1, y0, h=20):
+    """Axis-aligned CRAFT-style box, clockwise from top-left."""
+    return np.float32([[x0, y0], [x1, y0], [x1, y0 + h], [x0, y0 + h]])
+
+
+def spans(lines):
+    return [[(int(b[0, 0]), int(b[1, 0])) for b in line] for line in lines]
+
+
+def test_jittered_row_stays_one_line():
+    boxes = [box(10, 80, 100), box(90, 180, 102), box(200, 260, 99), box(270, 330, 101)]
+    assert spans(group_lines(boxes)) == [[(10, 80), (90, 180), (200, 260), (270, 330)]]
+
+
+def test_far_fragment_splits_in_reading_order():
+    boxes = [box(10, 80, 100), box(90, 180, 102), box(200, 260, 100), box(500, 560, 100)]
+    assert spans(group_lines(boxes)) == [[(10, 80), (90, 180), (200, 260)], [(500, 560)]]
+
+
+def test_two_columns_read_row_by_row_left_first():
+    left = [box(10, 200, y) for y in (0, 30, 60)]
+    right = [box(500, 600, 1), box(500, 560, 31)]
+    lines = spans(group_lines(right + left))
+    assert lines == [[(10, 200)], [(500, 600)], [(10, 200)], [(500, 560)], [(10, 200)]]
+
+
+def test_rows_one_line_apart_stay_separate():
+    boxes = [box(10, 80, 0), box(90, 150, 2), box(10, 80, 25), box(90, 150, 24)]
+    assert spans(group_lines(boxes)) == [[(10, 80), (90, 150)], [(10, 80), (90, 150)]]